@@ -1,7 +1,8 @@
 from dotenv import load_dotenv
 
-from qa_agent.orchestrator import graph, run_planner, run_runner, run_full
+from qa_agent.orchestrator import graph, run_planner, run_runner, run_full, stream_workflow
 from qa_agent.agents import create_planner_agent, create_runner_agent
+from qa_agent.crawler import crawl_site
 from qa_agent.workspace import init_workspace, get_path, WORKSPACE_ROOT, get_test_app_url
 from qa_agent.wrike_integration import WrikeIntegration, post_qa_results_to_wrike
 
@@ -12,8 +13,10 @@ __all__ = [
     "run_planner",
     "run_runner",
     "run_full",
+    "stream_workflow",
     "create_planner_agent",
     "create_runner_agent",
+    "crawl_site",
     "init_workspace",
     "get_path",
     "WORKSPACE_ROOT",
@@ -0,0 +1,61 @@
+"""Command line entry point: ``python -m qa_agent <command>``."""
+
+import argparse
+
+from dotenv import load_dotenv
+
+
+def main(argv: list[str] | None = None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="qa_agent", description="Zero-Touch QA commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    dedupe = commands.add_parser("dedupe_plans", help="Cluster near-duplicate test plans")
+    dedupe.add_argument("--apply", action="store_true", help="Move redundant plans to plans/.duplicates/")
+
+    worker = commands.add_parser("worker", help="Run test plans pulled from the work queue")
+    worker.add_argument("--queue", help="Work queue URL, sqlite:///path or redis://host (default: QA_QUEUE_URL)")
+    worker.add_argument("--max-jobs", type=int, help="Exit after this many jobs")
+    worker.add_argument("--idle-timeout", type=float, help="Exit after this many seconds without a job")
+
+    serve = commands.add_parser("serve", help="Run the QA service with a local HTTP API")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    serve.add_argument("--max-concurrent", type=int, help="Jobs run at once (default: QA_SERVICE_MAX_CONCURRENT)")
+    serve.add_argument("--max-queued", type=int, help="Jobs waiting before submissions are refused (default: QA_SERVICE_MAX_QUEUED)")
+    serve.add_argument("--no-warm", action="store_true", help="Start browsers and agents on first use instead of at startup")
+
+    accept = commands.add_parser("accept_baselines", help="Make a run's screenshots the visual baselines")
+    accept.add_argument("--run", help="Run ID (default: the latest run)")
+    accept.add_argument("names", nargs="*", help="Screenshot file names to accept (default: all)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "dedupe_plans":
+        from qa_agent.plan_index import dedupe_plans
+        dedupe_plans(apply=args.apply)
+    elif args.command == "worker":
+        from qa_agent.worker import run_worker
+        run_worker(queue_url=args.queue, max_jobs=args.max_jobs, idle_timeout=args.idle_timeout)
+    elif args.command == "accept_baselines":
+        from qa_agent.visual import accept_baselines
+        from qa_agent.workspace import RUNS_ROOT
+        runs = sorted(p for p in RUNS_ROOT.glob("*") if p.is_dir())
+        run_dir = RUNS_ROOT / args.run if args.run else (runs[-1] if runs else None)
+        if run_dir is None or not run_dir.is_dir():
+            parser.error(f"No run found{f' with ID {args.run}' if args.run else ''}")
+        accepted = accept_baselines(run_dir, args.names or None)
+        print(f"Accepted {len(accepted)} baselines from {run_dir.name}")
+    elif args.command == "serve":
+        from qa_agent.service import MAX_CONCURRENT, MAX_QUEUED, serve
+        serve(
+            host=args.host,
+            port=args.port,
+            max_concurrent=args.max_concurrent or MAX_CONCURRENT,
+            max_queued=MAX_QUEUED if args.max_queued is None else args.max_queued,
+            warm=not args.no_warm,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Filesystem backend for the planner agent that validates and deduplicates test plans."""
+
+from pathlib import Path
+
+from deepagents.backends import FilesystemBackend
+from deepagents.backends.protocol import WriteResult
+
+from qa_agent.plan_index import get_plan_index
+from qa_agent.plans import PlanCompileError, compile_plan, save_compiled
+from qa_agent.workspace import get_path
+
+
+class PlanFilesystemBackend(FilesystemBackend):
+    """Filesystem backend that validates and indexes new test plans.
+
+    Writes to ``plans/*.md`` have their structured steps compiled first and
+    are rejected if those don't validate. They are then skipped when they
+    near-duplicate an existing plan, unless they cover more steps: then they
+    are written alongside it. Existing plans are never overwritten. Either way
+    the resulting plan is recorded as planned by the current run.
+    All other writes behave like the regular filesystem backend.
+    """
+
+    def _is_plan(self, path: Path) -> bool:
+        return path.suffix == ".md" and path.resolve().parent == get_path("plans")
+
+    def write(self, file_path: str, content: str) -> WriteResult:
+        resolved_path = self._resolve_path(file_path)
+        if not self._is_plan(resolved_path):
+            return super().write(file_path, content)
+
+        try:
+            compiled = compile_plan(resolved_path.stem, content)
+        except PlanCompileError as e:
+            return WriteResult(error=f"Plan {file_path} not saved. {e}")
+
+        index = get_plan_index()
+        with index.lock:
+            decision = index.check(content, exclude=resolved_path.stem)
+            if decision.action == "skip":
+                index.mark_planned(decision.match)
+                return WriteResult(error=(
+                    f"Skipped {file_path}: near-duplicate of {decision.match}.md "
+                    f"(similarity {decision.score:.2f}). Write a plan for a different scenario instead."
+                ))
+
+            result = super().write(file_path, content)
+            if not result.error:
+                if compiled:
+                    save_compiled(compiled)
+                index.refresh()
+                index.mark_planned(resolved_path.stem)
+                if decision.match:
+                    print(
+                        f"Saved plan {resolved_path.name} alongside near-duplicate {decision.match}.md "
+                        f"({decision.score:.2f}); review with 'python -m qa_agent dedupe_plans'"
+                    )
+            return result
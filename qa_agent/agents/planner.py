@@ -1,13 +1,15 @@
 from deepagents import create_deep_agent
-from deepagents.backends import FilesystemBackend
 from langchain_openai import ChatOpenAI
-from qa_agent.workspace import get_path, WORKSPACE_ROOT
+from qa_agent.agents.backend import PlanFilesystemBackend
+from qa_agent.usage import USAGE_CALLBACK, BudgetMiddleware
+from qa_agent.workspace import WORKSPACE_ROOT
 from qa_agent.playwright_mcp import get_tools as get_playwright_tools
 
 
 def get_planner_prompt():
-    plans_dir = get_path("plans")
-    return f"""You are an Expert QA Test Planner Agent.
+    # Kept free of run- and host-specific values (absolute paths, URLs) so the
+    # prompt and tool schemas form a byte-stable prefix the provider can cache
+    return """You are an Expert QA Test Planner Agent.
 
 Your mission is to explore a web application and create test scenarios based on the USER'S REQUEST.
 
@@ -34,13 +36,17 @@ EXPLORATION PROCESS
    - If full test requested: explore all pages and features
 4. Identify testable scenarios for the requested scope
 
+If the request includes a SITE MAP, it was produced by a crawler that already
+visited those pages. Use it as your starting point: only navigate to pages you
+need to verify details for, and stay within the FEATURE AREA you were given.
+
 ═══════════════════════════════════════════════════════════════════════════════
 CREATE TEST FILES
 ═══════════════════════════════════════════════════════════════════════════════
 
 For EACH test scenario, create a markdown file:
 
-```markdown
+````markdown
 # Test: [Descriptive Test Name]
 
 ## Objective
@@ -59,34 +65,77 @@ For EACH test scenario, create a markdown file:
 
 ## Element Selectors
 - [Element]: [How to locate it]
+
+## Structured Steps
+```json
+[
+  {"action": "navigate", "target": "[URL]"},
+  {"action": "type", "target": "textbox \\"Pet Name\\"", "value": "Rex"},
+  {"action": "click", "target": "button \\"Save\\""},
+  {"action": "assert_text", "assertion": "Patient added"},
+  {"action": "screenshot", "value": "final_state"}
+]
 ```
+````
+
+═══════════════════════════════════════════════════════════════════════════════
+STRUCTURED STEPS
+═══════════════════════════════════════════════════════════════════════════════
+
+The "Structured Steps" JSON mirrors the Test Steps and Expected Results so the
+runner can execute the plan without re-reading the prose. Each step is:
+- navigate: target = URL
+- click / assert_visible: target
+- type / select: target, value
+- press: value = key name (e.g. "Enter")
+- wait: value = seconds, or text to wait for
+- assert_text: assertion = text that must appear on the page
+- assert_url: assertion = text the page URL must contain
+- screenshot: value = short description
+
+Element targets are written as: role "Accessible name", copied exactly from
+browser_snapshot (e.g. button "Save", textbox "Owner Name"). write_file rejects
+plans whose structured steps don't validate, fix them and save again.
 
 ═══════════════════════════════════════════════════════════════════════════════
 HOW TO SAVE FILES
 ═══════════════════════════════════════════════════════════════════════════════
 
 Use write_file tool to save each test scenario:
-- Path: {plans_dir}/<test_name>.md
-- Example: write_file(path="{plans_dir}/login_test.md", content="...")
+- Path: /plans/<test_name>.md
+- Example: write_file(path="/plans/login_test.md", content="...")
+- If write_file reports a near-duplicate, an equivalent plan already exists:
+  do NOT retry under another name, move on to a different scenario
 
-WORKSPACE ROOT: {WORKSPACE_ROOT}
-PLANS DIRECTORY: {plans_dir}
+File paths are relative to the QA workspace: test plans go in /plans/.
 
 REQUIREMENTS:
 - Create tests ONLY for what the user requested
 - Use write_file for EACH test scenario
-- Use FULL PATHS
+- Save plans under /plans/
 - Call browser_close when done
 """
 
 
-def create_planner_agent():
-    model = ChatOpenAI(model="gpt-4o")
-    tools = get_playwright_tools()
-    backend = FilesystemBackend(root_dir=str(WORKSPACE_ROOT))
-    return create_deep_agent(
+def create_planner_agent(client=None):
+    """Get the planner agent for an MCP session, compiling it on first use."""
+    prompt = get_planner_prompt()
+    cached = _agent_cache.get((id(client), prompt))
+    if cached is not None:
+        return cached
+    
+    model = ChatOpenAI(model="gpt-4o", callbacks=[USAGE_CALLBACK], model_kwargs={"prompt_cache_key": "qa-planner"})
+    tools = get_playwright_tools(client)
+    backend = PlanFilesystemBackend(root_dir=str(WORKSPACE_ROOT), virtual_mode=True)
+    agent = create_deep_agent(
         model=model,
         tools=tools,
-        system_prompt=get_planner_prompt(),
+        system_prompt=prompt,
         backend=backend,
+        middleware=[BudgetMiddleware()],
     )
+    _agent_cache[(id(client), prompt)] = agent
+    return agent
+
+
+_agent_cache: dict[tuple[int, str], object] = {}
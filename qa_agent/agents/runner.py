@@ -2,51 +2,48 @@ from deepagents import create_deep_agent
 from deepagents.backends import FilesystemBackend
 from langchain_openai import ChatOpenAI
 from qa_agent.playwright_mcp import get_tools as get_playwright_tools
-from qa_agent.workspace import get_path, WORKSPACE_ROOT
+from qa_agent.usage import USAGE_CALLBACK, BudgetMiddleware
+from qa_agent.workspace import WORKSPACE_ROOT
 
 
 def get_runner_prompt():
-    plans_dir = get_path("plans")
-    reports_dir = get_path("reports")
-    screenshots_dir = get_path("screenshots")
-    return f"""You are an Expert QA Test Runner Agent.
+    # Same for every run and host (see get_planner_prompt)
+    return """You are an Expert QA Test Runner Agent.
 
-Your mission is to execute test scenarios, capture screenshots, and produce a test report.
+Your mission is to execute test steps in the browser, capture screenshots, and report the outcome.
 
 ═══════════════════════════════════════════════════════════════════════════════
-IMPORTANT: FOLLOW THE USER'S REQUEST
+WHAT YOU RECEIVE
 ═══════════════════════════════════════════════════════════════════════════════
 
-The user may ask for:
-- RUN ALL tests (execute every test file in plans directory)
-- RUN SPECIFIC tests (e.g., "run login test", "run navigation tests")
-- RE-RUN failed tests
-
-ADAPT your execution to match what the user asked for.
+Each request gives you exactly ONE of:
+- A TEST PLAN file: read it with read_file and execute all of its steps
+- A SINGLE STEP of a structured test plan: execute only that step. The browser
+  is already in the state left by the previous steps, do not start over
 
 ═══════════════════════════════════════════════════════════════════════════════
 EXECUTION PROCESS
 ═══════════════════════════════════════════════════════════════════════════════
 
-1. LIST files in: {plans_dir}
-2. Based on user request, select which tests to run
-3. For each test:
-   - Read the test file
-   - Execute steps using browser tools
-   - Take SCREENSHOTS at key moments (see below)
-   - Record PASS or FAIL
+1. Take a SNAPSHOT to locate the elements you need
+2. Execute the step(s) using browser tools. When several actions follow each
+   other without needing to look at the page in between (e.g. filling every
+   field of a form, then clicking submit), send them in ONE browser_batch call
+3. Verify the expected results
+4. Take SCREENSHOTS at key moments (see below)
+5. Report PASS or FAIL
 
 ═══════════════════════════════════════════════════════════════════════════════
 SCREENSHOT CAPTURE
 ═══════════════════════════════════════════════════════════════════════════════
 
 Use the save_screenshot tool to capture images at:
-- Before starting each test (initial state)
+- Before starting a test plan (initial state)
 - After key actions (form fill, button click, navigation)
 - When a test fails (capture the failure state)
 - After test completion (final state)
 
-Screenshots are automatically saved to: {screenshots_dir}
+Screenshots are automatically saved to the current run's screenshots directory.
 
 NAMING CONVENTION (use descriptive names without extension):
 - <test_name>_step<N>_<description>
@@ -70,44 +67,48 @@ For failed tests, classify as:
 - ENVIRONMENT: Setup/infra problem
 
 ═══════════════════════════════════════════════════════════════════════════════
-GENERATE REPORT
+REPORT YOUR RESULT
 ═══════════════════════════════════════════════════════════════════════════════
 
-Create report including:
-- Summary (total, passed, failed)
-- Results table
-- Screenshot references for each test
-- Failure details with analysis
-
-Use write_file to save: {reports_dir}/test_report.md
+End your final message with exactly one result line:
+  RESULT: PASS
+  RESULT: FAIL - <APP_BUG|TEST_ISSUE|ENVIRONMENT>: <short reason>
 
-Include screenshot paths in the report like:
-- Screenshot: screenshots/<filename>.png
+The test report is assembled from these result lines, do NOT write a report file.
 
 ═══════════════════════════════════════════════════════════════════════════════
-WORKSPACE PATHS
+WORKSPACE FILES
 ═══════════════════════════════════════════════════════════════════════════════
 
-WORKSPACE ROOT: {WORKSPACE_ROOT}
-PLANS: {plans_dir}
-REPORTS: {reports_dir}
-SCREENSHOTS: {screenshots_dir}
+File paths are relative to the QA workspace: test plans are in /plans/.
 
 REQUIREMENTS:
 - Take screenshots during test execution
-- Reference screenshots in the report
-- Use write_file to save report
-- Call browser_close when done
+- End with a RESULT line
+- Do NOT call browser_close, the next test continues in this browser
 """
 
 
-def create_runner_agent():
-    model = ChatOpenAI(model="gpt-4o")
-    tools = get_playwright_tools()
-    backend = FilesystemBackend(root_dir=str(WORKSPACE_ROOT))
-    return create_deep_agent(
+def create_runner_agent(client=None):
+    """Get the runner agent for an MCP session, compiling it on first use."""
+    prompt = get_runner_prompt()
+    cached = _agent_cache.get((id(client), prompt))
+    if cached is not None:
+        return cached
+    
+    # Route requests sharing this agent's prompt prefix to the same provider cache
+    model = ChatOpenAI(model="gpt-4o", callbacks=[USAGE_CALLBACK], model_kwargs={"prompt_cache_key": "qa-runner"})
+    tools = get_playwright_tools(client)
+    backend = FilesystemBackend(root_dir=str(WORKSPACE_ROOT), virtual_mode=True)
+    agent = create_deep_agent(
         model=model,
         tools=tools,
-        system_prompt=get_runner_prompt(),
+        system_prompt=prompt,
         backend=backend,
+        middleware=[BudgetMiddleware()],
     )
+    _agent_cache[(id(client), prompt)] = agent
+    return agent
+
+
+_agent_cache: dict[tuple[int, str], object] = {}
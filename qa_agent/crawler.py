@@ -0,0 +1,173 @@
+"""Concurrent site crawler that seeds planner exploration.
+
+Walks the same-origin routes of the target app across pooled browser
+sessions without involving the LLM. The result is a route map with a
+summary of each page's interactive elements, partitioned into feature
+areas so the planner can fan out one sub-agent per area.
+"""
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from urllib.parse import urljoin, urlparse
+
+from qa_agent.playwright_mcp import get_browser_pool
+from qa_agent.workspace import get_test_app_url
+
+MAX_PAGES = int(os.environ.get("QA_CRAWL_MAX_PAGES", "30"))
+MAX_ELEMENTS_PER_PAGE = 40
+
+INTERACTIVE_ROLES = {
+    "button", "link", "textbox", "searchbox", "combobox", "listbox", "checkbox",
+    "radio", "switch", "slider", "spinbutton", "tab", "menuitem", "option",
+}
+
+_PAGE_URL_RE = re.compile(r"^- Page URL: (.+)$", re.M)
+_PAGE_TITLE_RE = re.compile(r"^- Page Title: (.*)$", re.M)
+_NODE_RE = re.compile(r'^\s*- (\w+)(?: "((?:[^"\\]|\\.)*)")?')
+_HREF_RE = re.compile(r"^\s*- /url: (.+)$")
+_ID_SEGMENT_RE = re.compile(r"^(\d+|[0-9a-f]{8}-[0-9a-f-]{27,}|[0-9a-f]{16,})$", re.I)
+
+
+@dataclass
+class PageSummary:
+    """What the crawler learned about a single route."""
+
+    url: str
+    title: str = ""
+    headings: list[str] = field(default_factory=list)
+    elements: list[str] = field(default_factory=list)
+    links: list[str] = field(default_factory=list)
+    error: str = ""
+
+
+def _normalize_url(url: str) -> str:
+    """Drop query strings and non-route fragments so each route is visited once."""
+    parsed = urlparse(url)
+    fragment = parsed.fragment if parsed.fragment.startswith("/") else ""
+    path = parsed.path or "/"
+    normalized = f"{parsed.scheme}://{parsed.netloc}{path}"
+    return f"{normalized}#{fragment}" if fragment else normalized
+
+
+def _route_path(url: str) -> str:
+    """Return the app route for a URL, honouring hash-based routers."""
+    parsed = urlparse(url)
+    return parsed.fragment if parsed.fragment.startswith("/") else (parsed.path or "/")
+
+
+def route_pattern(url: str) -> str:
+    """Collapse id-like path segments so ``/patients/1`` and ``/patients/2`` match."""
+    segments = [":id" if _ID_SEGMENT_RE.match(s) else s for s in _route_path(url).split("/") if s]
+    return "/" + "/".join(segments)
+
+
+def feature_area(url: str) -> str:
+    """Name the feature area a route belongs to (its first path segment)."""
+    segments = [s for s in route_pattern(url).split("/") if s]
+    return segments[0] if segments else "home"
+
+
+def parse_snapshot(text: str, page_url: str) -> PageSummary:
+    """Extract title, headings, interactive elements and links from an MCP snapshot."""
+    url_match = _PAGE_URL_RE.search(text)
+    title_match = _PAGE_TITLE_RE.search(text)
+    summary = PageSummary(
+        url=url_match.group(1).strip() if url_match else page_url,
+        title=title_match.group(1).strip() if title_match else "",
+    )
+
+    for line in text.splitlines():
+        href = _HREF_RE.match(line)
+        if href:
+            summary.links.append(urljoin(summary.url, href.group(1).strip()))
+            continue
+        node = _NODE_RE.match(line)
+        if not node:
+            continue
+        role, name = node.group(1), node.group(2) or ""
+        if role == "heading" and name:
+            summary.headings.append(name)
+        elif role in INTERACTIVE_ROLES and len(summary.elements) < MAX_ELEMENTS_PER_PAGE:
+            summary.elements.append(f'{role} "{name}"' if name else role)
+    return summary
+
+
+def _visit(url: str) -> PageSummary:
+    """Load one route in a pooled browser and summarize it."""
+    with get_browser_pool().acquire() as client:
+        try:
+            text = client.call_tool("browser_navigate", {"url": url}, raw=True)
+            if "Page Snapshot" not in text:
+                text = client.call_tool("browser_snapshot", raw=True)
+        except Exception as e:
+            return PageSummary(url=url, error=str(e))
+    return parse_snapshot(text, url)
+
+
+def crawl_site(start_url: str | None = None, max_pages: int = MAX_PAGES) -> dict:
+    """Crawl same-origin routes of the app concurrently.
+
+    Args:
+        start_url: Where to start (defaults to the configured test app URL)
+        max_pages: Upper bound on the number of distinct routes visited
+
+    Returns:
+        JSON-serializable site map with ``start_url``, ``pages`` keyed by URL and
+        ``areas`` mapping each feature area to the URLs it covers.
+    """
+    start_url = _normalize_url(start_url or get_test_app_url())
+    origin = urlparse(start_url).netloc
+    pool = get_browser_pool()
+
+    pages: dict[str, PageSummary] = {}
+    seen_patterns = {route_pattern(start_url)}
+    pending: dict[Future, str] = {}
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        pending[executor.submit(_visit, start_url)] = start_url
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending.pop(future)
+                page = future.result()
+                pages[url] = page
+                for link in page.links:
+                    link = _normalize_url(link)
+                    pattern = route_pattern(link)
+                    if urlparse(link).netloc != origin or pattern in seen_patterns:
+                        continue
+                    if len(seen_patterns) >= max_pages:
+                        break
+                    seen_patterns.add(pattern)
+                    pending[executor.submit(_visit, link)] = link
+
+    areas: dict[str, list[str]] = {}
+    for url in sorted(pages):
+        areas.setdefault(feature_area(url), []).append(url)
+
+    print(f"Crawled {len(pages)} routes in {len(areas)} feature areas")
+    return {
+        "start_url": start_url,
+        "pages": {url: asdict(page) for url, page in pages.items()},
+        "areas": areas,
+    }
+
+
+def area_summary(site_map: dict, area: str) -> str:
+    """Render the markdown summary of one feature area for a planner sub-agent."""
+    lines = [f"FEATURE AREA: {area}"]
+    for url in site_map.get("areas", {}).get(area, []):
+        page = site_map["pages"][url]
+        lines.append(f"\n### {url}")
+        if page.get("error"):
+            lines.append(f"- Could not load: {page['error']}")
+            continue
+        if page.get("title"):
+            lines.append(f"- Title: {page['title']}")
+        if page.get("headings"):
+            lines.append(f"- Headings: {', '.join(page['headings'])}")
+        for element in page.get("elements", []):
+            lines.append(f"- {element}")
+    return "\n".join(lines)
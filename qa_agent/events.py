@@ -0,0 +1,18 @@
+"""Progress events for streamed workflow runs.
+
+Nodes and the code they call report progress with ``emit``; the events
+reach callers of ``stream_workflow`` through LangGraph's custom stream
+mode and are dropped when the workflow runs with ``graph.invoke``.
+"""
+
+from langgraph.config import get_stream_writer
+
+
+def emit(event_type: str, **data):
+    """Send a progress event to the workflow stream, if there is one."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Not running inside the workflow graph (e.g. a queue worker)
+        return
+    writer({"type": event_type, **data})
@@ -0,0 +1,109 @@
+"""Evidence selection and packaging for Wrike attachments.
+
+Picks the screenshots a reviewer needs from a run's results (failure
+states first, then final states of failed tests, then final states of
+passing ones) and packs them into a single downscaled contact sheet, or
+a zip archive when Pillow is not installed.
+"""
+
+import os
+import zipfile
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+from qa_agent.results import PlanResult
+
+MAX_EVIDENCE = int(os.environ.get("QA_WRIKE_MAX_EVIDENCE", "12"))
+THUMBNAIL_WIDTH = 480
+SHEET_COLUMNS = 3
+CAPTION_HEIGHT = 22
+
+
+def select_evidence(
+    screenshots_dir: Path,
+    results: list[PlanResult] | None = None,
+    limit: int = MAX_EVIDENCE,
+) -> list[tuple[Path, str]]:
+    """Choose the screenshots worth attaching, most relevant first.
+
+    Args:
+        screenshots_dir: The run's screenshots directory
+        results: The run's per-plan results. Without them, screenshots are
+            picked by name (``*_failed.png``, then ``*_final.png``)
+        limit: Maximum number of screenshots
+
+    Returns:
+        (screenshot path, caption) pairs
+    """
+    if results is None:
+        failed = sorted(screenshots_dir.glob("*_failed.png"))
+        finals = sorted(screenshots_dir.glob("*_final.png"))
+        return [(p, p.stem) for p in [*failed, *finals]][:limit]
+
+    failures = [r for r in results if r.status == "FAIL"]
+    candidates = [
+        # Failure states: the screenshot taken at the failing step, or named so by the agent
+        *((r, name) for r in failures for name in r.screenshots if "fail" in name.removeprefix(r.plan).lower()),
+        # Final states of failed tests, then of passing ones
+        *((r, name) for r in failures for name in r.screenshots if name.endswith("_final.png")),
+        *((r, name) for r in results if r.passed for name in r.screenshots if name.endswith("_final.png")),
+    ]
+    selected = []
+    for result, name in candidates:
+        path = screenshots_dir / name
+        if path.exists():
+            step = f" at step {result.failed_step}" if result.status == "FAIL" and result.failed_step else ""
+            selected.append((path, f"{result.status}{step}: {result.label}"))
+    return selected[:limit]
+
+
+def build_contact_sheet(evidence: list[tuple[Path, str]], output_path: Path) -> Path:
+    """Pack screenshots into one captioned, downscaled JPEG grid."""
+    thumbnails = []
+    for path, caption in evidence:
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            height = round(image.height * THUMBNAIL_WIDTH / image.width)
+            thumbnails.append((image.resize((THUMBNAIL_WIDTH, height), Image.Resampling.LANCZOS), caption))
+
+    columns = min(SHEET_COLUMNS, len(thumbnails))
+    rows = [thumbnails[i:i + columns] for i in range(0, len(thumbnails), columns)]
+    row_heights = [max(thumb.height for thumb, _ in row) + CAPTION_HEIGHT for row in rows]
+    sheet = Image.new("RGB", (columns * THUMBNAIL_WIDTH, sum(row_heights)), "white")
+    draw = ImageDraw.Draw(sheet)
+
+    top = 0
+    for row, row_height in zip(rows, row_heights):
+        for column, (thumb, caption) in enumerate(row):
+            left = column * THUMBNAIL_WIDTH
+            draw.text((left + 6, top + 5), caption, fill="red" if caption.startswith("FAIL") else "black")
+            sheet.paste(thumb, (left, top + CAPTION_HEIGHT))
+        top += row_height
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    sheet.save(output_path, "JPEG", quality=80, optimize=True)
+    return output_path
+
+
+def package_evidence(evidence: list[tuple[Path, str]], output_dir: Path, name: str = "evidence") -> Path | None:
+    """Pack the selected screenshots into a single attachment.
+
+    Returns:
+        Path of the contact sheet (``<name>.jpg``), or of a zip archive
+        (``<name>.zip``) without Pillow; None if there is no evidence
+    """
+    if not evidence:
+        return None
+    if Image is not None:
+        return build_contact_sheet(evidence, output_dir / f"{name}.jpg")
+
+    archive_path = output_dir / f"{name}.zip"
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+        for path, _ in evidence:
+            archive.write(path, arcname=path.name)
+    return archive_path
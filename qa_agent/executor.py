@@ -0,0 +1,429 @@
+"""Per-plan test execution for the runner node.
+
+Compiled plans are executed step by step: steps that map directly onto a
+Playwright MCP tool run without the LLM, and only the rest are handed to
+the runner agent as one compact step each. Free-form markdown plans are
+given to the agent whole.
+"""
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Iterator
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from qa_agent.agents import create_runner_agent
+from qa_agent.events import emit
+from qa_agent.history import (
+    FLAKY_WINDOW,
+    ResultsHistory,
+    classify_failure,
+    is_flaky,
+    order_plans,
+    shard_plans,
+    should_retry,
+)
+from qa_agent.plans import ELEMENT_TARGET_RE, CompiledPlan, PlanStep, load_plan
+from qa_agent.playwright_mcp import (
+    BrowserPool,
+    MCPBackgroundThread,
+    MCPToolError,
+    _mcp,
+    deadline,
+    get_browser_pool,
+    save_screenshot,
+    track_screenshots,
+)
+from qa_agent.results import PlanResult, parse_agent_result
+from qa_agent.usage import (
+    budget_exceeded,
+    get_run_usage,
+    run_budget_exceeded,
+    usage_scope,
+)
+from qa_agent.visual import check_visual_regressions
+from qa_agent.workspace import (
+    TEST_APP_URL,
+    agent_path,
+    app_url,
+    get_cell,
+    get_path,
+    get_test_app_url,
+    rebase_urls,
+)
+
+RUNNER_WORKERS = int(os.environ.get("QA_RUNNER_WORKERS", "1"))
+MAX_RETRIES = int(os.environ.get("QA_MAX_RETRIES", "2"))
+PLAN_TIMEOUT = float(os.environ.get("QA_PLAN_TIMEOUT", "900"))  # seconds, 0 = no limit
+
+MUTATING_ACTIONS = {"click", "type", "select", "press"}
+
+_PAGE_URL_RE = re.compile(r"^- Page URL: (.+)$", re.M)
+
+
+class StepExecutor:
+    """Executes trivially-mappable plan steps directly over an MCP session."""
+
+    def __init__(self, client: MCPBackgroundThread):
+        self.client = client
+        self._snapshot = ""
+
+    def _call(self, tool: str, arguments: dict | None = None) -> str:
+        text = self.client.call_tool(tool, arguments, check=True, raw=True)
+        if "Page Snapshot" in text:
+            self._snapshot = text
+        return text
+
+    def _refresh(self) -> str:
+        self._snapshot = self.client.call_tool("browser_snapshot", check=True, raw=True)
+        return self._snapshot
+
+    @property
+    def page_url(self) -> str:
+        match = _PAGE_URL_RE.search(self._snapshot)
+        return match.group(1).strip() if match else ""
+
+    def resolve_ref(self, target: str) -> str | None:
+        """Find the snapshot ref of a ``role "name"`` target, refreshing once if needed."""
+        role, name = ELEMENT_TARGET_RE.match(target).groups()
+        pattern = re.compile(rf'- {re.escape(role)} "{re.escape(name)}"[^\n]*?\[ref=([^\]]+)\]')
+        match = pattern.search(self._snapshot) or pattern.search(self._refresh())
+        return match.group(1) if match else None
+
+    def run(self, step: PlanStep, screenshot_name: str) -> bool:
+        """Execute a step directly.
+
+        Returns:
+            True if the step ran and its checks held, False if it could not be
+            executed or checked directly and needs the agent.
+        """
+        try:
+            if step.action == "navigate":
+                self._call("browser_navigate", {"url": app_url(step.target)})
+            elif step.action == "press":
+                self._call("browser_press_key", {"key": step.value})
+            elif step.action == "wait":
+                try:
+                    self._call("browser_wait_for", {"time": float(step.value)})
+                except ValueError:
+                    self._call("browser_wait_for", {"text": step.value})
+            elif step.action == "screenshot":
+                return save_screenshot(screenshot_name, self.client).startswith("Screenshot saved:")
+            elif step.action == "assert_text":
+                self._call("browser_wait_for", {"text": step.assertion})
+            elif step.action == "assert_url":
+                self._refresh()
+                return step.assertion in self.page_url
+            else:
+                ref = self.resolve_ref(step.target)
+                if ref is None:
+                    return False
+                if step.action == "click":
+                    self._call("browser_click", {"element": step.target, "ref": ref})
+                elif step.action == "type":
+                    self._call("browser_type", {"element": step.target, "ref": ref, "text": step.value})
+                elif step.action == "select":
+                    self._call("browser_select_option", {"element": step.target, "ref": ref, "values": [step.value]})
+            return True
+        except MCPToolError:
+            return False
+
+
+def _on_target(step: PlanStep) -> PlanStep:
+    """Return the step with URLs under TEST_APP_URL moved to the current target (see ``rebase_urls``)."""
+    fields = {name: rebase_urls(getattr(step, name)) for name in ("target", "value", "assertion") if getattr(step, name)}
+    return step.model_copy(update=fields)
+
+
+# Requests open with their fixed instruction and end with the run-specific
+# values, so consecutive requests share as long a prefix as possible
+def _step_request(plan: CompiledPlan, number: int, step: PlanStep, page_url: str) -> str:
+    return f"""Execute ONLY this step, then end with your RESULT line.
+
+TARGET APPLICATION: {get_test_app_url()}
+TEST: {plan.title} ({plan.name}), step {number} of {len(plan.steps)}
+CURRENT PAGE: {page_url or "unknown"}
+STEP: {step.model_dump_json(exclude_none=True)}
+"""
+
+
+def _plan_request(name: str) -> str:
+    target = get_test_app_url()
+    # Matrix cells run plans written against TEST_APP_URL on another target
+    rebase = (
+        f"URLS: the plan was written against {TEST_APP_URL}; use every URL under it "
+        f"at the same path under TARGET APPLICATION instead, including in URL checks\n"
+    ) if target != TEST_APP_URL else ""
+    return f"""Execute this test plan, then end with your RESULT line.
+
+TARGET APPLICATION: {target}
+TEST PLAN: {agent_path(get_path("plans") / f"{name}.md")}
+{rebase}"""
+
+
+def _ask_agent(agent, request: str) -> tuple[str, str, str]:
+    result = agent.invoke({"messages": [HumanMessage(content=request)]})
+    return parse_agent_result(result["messages"][-1].content)
+
+
+def resume_point(plan: CompiledPlan, failed_step: int) -> int:
+    """Pick the step a retry can restart from without losing app state.
+
+    Steps before the first state-changing action are read-only, so a retry
+    can skip them: it restarts at the failing step if nothing before it
+    changed state, otherwise at the last navigation before the first change.
+    """
+    before = plan.steps[:failed_step - 1]
+    first_change = next((i for i, step in enumerate(before, start=1) if step.action in MUTATING_ACTIONS), None)
+    if first_change is None:
+        return failed_step
+    return max((i for i, step in enumerate(before[:first_change], start=1) if step.action == "navigate"), default=1)
+
+
+def _run_compiled(
+    plan: CompiledPlan,
+    agent,
+    client: MCPBackgroundThread,
+    result: PlanResult,
+    start_step: int = 1,
+    start_url: str = "",
+):
+    executor = StepExecutor(client)
+    result.steps_total = len(plan.steps)
+    if start_url:
+        executor._call("browser_navigate", {"url": start_url})
+    for number, step in enumerate(plan.steps, start=1):
+        if number < start_step:
+            continue
+        step = _on_target(step)
+        result.trace.append(executor.page_url)
+        screenshot_name = step.value if step.action == "screenshot" else ""
+        if screenshot_name and not screenshot_name.startswith(plan.name):
+            screenshot_name = f"{plan.name}_step{number}_{screenshot_name}"
+        if executor.run(step, screenshot_name):
+            result.steps_direct += 1
+            continue
+
+        over_budget = budget_exceeded()
+        if over_budget:
+            result.status, result.details = "SKIPPED", over_budget
+            return
+        status, category, details = _ask_agent(agent, _step_request(plan, number, step, executor.page_url))
+        if status != "PASS":
+            result.status, result.category, result.details = status, category, details
+            result.failed_step = number
+            save_screenshot(f"{plan.name}_step{number}_failed", client)
+            return
+    result.status = "PASS"
+
+
+def plan_key(name: str) -> str:
+    """Name a plan's usage and history are tracked under: in a matrix run, qualified by its cell."""
+    cell = get_cell()
+    return f"{name} @ {cell}" if cell else name
+
+
+def execute_plan(
+    name: str,
+    agent,
+    client: MCPBackgroundThread | None = None,
+    resume_from: PlanResult | None = None,
+) -> PlanResult:
+    """Execute one test plan and return its result.
+
+    Args:
+        name: Plan name (markdown file stem in the plans directory)
+        agent: Runner agent used for steps that cannot be executed directly
+        client: MCP session the agent's tools are bound to (defaults to the global session)
+        resume_from: Failed result of an earlier attempt. If it recorded a trace,
+            a compiled plan resumes from its failing step (see ``resume_point``)
+
+    Browser calls share a deadline of QA_PLAN_TIMEOUT seconds; once it has
+    passed, the next browser call fails the plan as an ENVIRONMENT issue.
+    A plan stopped by the run or plan budget is SKIPPED, with the budget as details.
+    """
+    client = client or _mcp
+    started = time.time()
+    key = plan_key(name)
+    result = PlanResult(plan=name, status="FAIL", cell=get_cell())
+    print(f"▶️  Running {key}")
+
+    with usage_scope(plan=key), deadline(PLAN_TIMEOUT), track_screenshots() as screenshots:
+        try:
+            plan = load_plan(name)
+            if plan:
+                start_step, start_url = 1, ""
+                if resume_from and resume_from.failed_step and resume_from.trace:
+                    start_step = resume_point(plan, resume_from.failed_step)
+                    start_url = resume_from.trace[start_step - 1] if start_step <= len(resume_from.trace) else ""
+                    if not start_url:
+                        start_step = 1
+                    else:
+                        result.trace = resume_from.trace[:start_step - 1]
+                        print(f"   Resuming from step {start_step} at {start_url}")
+                _run_compiled(plan, agent, client, result, start_step, start_url)
+                if result.status != "SKIPPED":
+                    save_screenshot(f"{name}_final", client)
+            else:
+                result.status, result.category, result.details = _ask_agent(agent, _plan_request(name))
+        except Exception as e:
+            result.status, result.category, result.details = "FAIL", "ENVIRONMENT", str(e)
+
+    # An agent stopped by BudgetMiddleware reports a TEST_ISSUE; that is no test outcome
+    over_budget = budget_exceeded(plan=key) if result.category == "TEST_ISSUE" else ""
+    if over_budget:
+        result.status, result.category, result.details = "SKIPPED", "", over_budget
+        result.failed_step = None
+
+    result.duration = time.time() - started
+    # Names are relative to the run's screenshots directory (cells have subdirectories)
+    prefix = f"{result.cell}/" if result.cell else ""
+    result.screenshots = sorted({prefix + screenshot for screenshot in screenshots})
+    # Before the outcome is recorded or streamed, so a visual failure counts everywhere
+    check_visual_regressions([result])
+    result.usage = asdict(get_run_usage().plan_usage(key))
+    print(f"   {key}: {result.status} in {result.duration:.1f}s")
+    return result
+
+
+@contextmanager
+def _fresh_browser(client: MCPBackgroundThread | None) -> Iterator[MCPBackgroundThread]:
+    """Yield an isolated session with a new browser context for a retry.
+
+    Pooled sessions are isolated, so closing their browser is enough. The
+    global session keeps a persistent profile, so retries borrow a pooled one.
+    """
+    def reset(session: MCPBackgroundThread) -> MCPBackgroundThread:
+        try:
+            session.call_tool("browser_close", raw=True)
+        except Exception as e:
+            print(f"Warning: Could not close browser before retry: {e}")
+        return session
+
+    if client is not None and client is not _mcp:
+        yield reset(client)
+        return
+    with get_browser_pool().acquire() as pooled:
+        yield reset(pooled)
+
+
+def execute_with_retries(
+    name: str,
+    agent,
+    client: MCPBackgroundThread | None,
+    history: ResultsHistory,
+    run_id: str,
+) -> PlanResult:
+    """Execute a plan, retrying failures the history marks as likely transient."""
+    key = plan_key(name)
+    started = time.time()
+    result = execute_plan(name, agent, client)
+    classification = classify_failure(key, history) if result.status == "FAIL" else ""
+    history.record(run_id, result, started, plan=key)
+
+    attempts = 1
+    while (
+        result.status == "FAIL"
+        and attempts <= MAX_RETRIES
+        and should_retry(classification, result)
+        and not budget_exceeded(plan=key)
+    ):
+        attempts += 1
+        print(f"   Retrying {key} ({classification} failure), attempt {attempts} of {MAX_RETRIES + 1}")
+        with _fresh_browser(client) as retry_client:
+            retry_agent = agent if retry_client is client else create_runner_agent(retry_client)
+            started = time.time()
+            result = execute_plan(name, retry_agent, retry_client, resume_from=result)
+        result.attempts = attempts
+        history.record(run_id, result, started, plan=key)
+
+    result.flaky = is_flaky(history.outcomes(key, FLAKY_WINDOW))
+    return result
+
+
+def emit_result(result: PlanResult):
+    """Report a finished plan to the workflow stream."""
+    emit(
+        "test_result",
+        plan=result.plan,
+        cell=result.cell,
+        status=result.status,
+        category=result.category,
+        details=result.details,
+        duration=round(result.duration, 1),
+        attempts=result.attempts,
+        flaky=result.flaky,
+    )
+
+
+def run_plans(
+    plans: list[str],
+    run_id: str,
+    workers: int = RUNNER_WORKERS,
+    fail_fast: bool = False,
+    cancel: threading.Event | None = None,
+    pool: BrowserPool | None = None,
+) -> list[PlanResult]:
+    """Execute plans in history-driven order and record each outcome.
+
+    With one worker, plans run on the global browser session with recently
+    failing plans first. With several, plans are sharded longest-first
+    across pooled browser sessions, one runner agent per shard. Failures
+    that look transient are retried in a fresh browser context, up to
+    QA_MAX_RETRIES times.
+
+    Args:
+        plans: Plan names to execute
+        run_id: Identifier the outcomes are recorded under
+        workers: Number of plans to execute concurrently
+        fail_fast: Stop starting new plans after the first failure; the
+            plans that never started are reported as SKIPPED
+        cancel: Set by the caller to stop starting new plans, like fail-fast
+        pool: Browser pool to run on (e.g. of one matrix profile). With a
+            pool, a single worker also runs on a pooled session instead of
+            the global one
+    """
+    if not plans:
+        return []
+    history = ResultsHistory()
+    stop = cancel or threading.Event()
+
+    def run_shard(shard: list[str], client: MCPBackgroundThread | None = None) -> list[PlanResult]:
+        agent = create_runner_agent(client)
+        results = []
+        for name in shard:
+            if stop.is_set():
+                results.append(PlanResult(plan=name, status="SKIPPED"))
+                continue
+            over_budget = run_budget_exceeded()
+            if over_budget:
+                results.append(PlanResult(plan=name, status="SKIPPED", details=over_budget))
+                continue
+            result = execute_with_retries(name, agent, client, history, run_id)
+            results.append(result)
+            emit_result(result)
+            if fail_fast and result.status == "FAIL":
+                print(f"Fail-fast: {name} failed, not starting remaining tests")
+                stop.set()
+        return results
+
+    sessions = pool or get_browser_pool()
+
+    def run_pooled_shard(shard: list[str]) -> list[PlanResult]:
+        with sessions.acquire() as client:
+            return run_shard(shard, client)
+
+    workers = min(workers, sessions.size, len(plans))
+    if workers <= 1:
+        ordered = order_plans(plans, history)
+        return run_pooled_shard(ordered) if pool else run_shard(ordered)
+
+    shards = shard_plans(plans, workers, history)
+    print(f"Running {len(plans)} tests across {len(shards)} workers")
+    with ContextThreadPoolExecutor(max_workers=len(shards)) as executor:
+        return [result for shard in executor.map(run_pooled_shard, shards) for result in shard]
@@ -0,0 +1,217 @@
+"""Results history store and history-driven test scheduling.
+
+Every executed plan is recorded in a SQLite database in the workspace,
+indexed by plan. The runner uses it to order plans so recently failing
+ones run first, to split plans across workers longest-first so the
+shards finish at about the same time, and to tell flaky or newly broken
+plans (worth a retry) from persistently failing ones.
+"""
+
+import heapq
+import json
+import sqlite3
+import statistics
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+
+from qa_agent.results import PlanResult
+from qa_agent.workspace import WORKSPACE_ROOT
+
+DB_FILENAME = "history.db"
+DEFAULT_DURATION = 60.0
+DURATION_WINDOW = 5
+FLAKY_WINDOW = 10
+FLAKY_MIN_FLIPS = 2
+PERSISTENT_FAILURES = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    category TEXT,
+    failed_step INTEGER,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    trace TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_plan_runs_plan ON plan_runs (plan, started_at);
+"""
+
+
+@dataclass
+class PlanStats:
+    """What the history says about one plan."""
+
+    runs: int = 0
+    last_outcome: str = ""
+    expected_duration: float | None = None
+
+    @property
+    def recently_failed(self) -> bool:
+        return self.last_outcome == "FAIL"
+
+
+class ResultsHistory:
+    """SQLite-backed record of per-plan outcomes and durations.
+
+    A connection is opened per call so the store can be shared by runner
+    threads and by concurrent processes on the same workspace.
+    """
+
+    def __init__(self, db_path: Path | None = None):
+        self.db_path = Path(db_path or WORKSPACE_ROOT / DB_FILENAME)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+            # Databases created before retries were tracked lack these columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(plan_runs)")}
+            if "attempt" not in columns:
+                conn.execute("ALTER TABLE plan_runs ADD COLUMN attempt INTEGER NOT NULL DEFAULT 1")
+            if "trace" not in columns:
+                conn.execute("ALTER TABLE plan_runs ADD COLUMN trace TEXT")
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def record(self, run_id: str, result: PlanResult, started_at: float | None = None, plan: str | None = None):
+        """Store the outcome of one plan execution (one attempt), under ``plan`` if given.
+
+        Skipped plans (stopped early or by a budget) have no outcome and are not stored.
+        """
+        if result.status == "SKIPPED":
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO plan_runs (run_id, plan, started_at, duration, outcome, category, failed_step, attempt, trace) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, plan or result.plan, started_at or time.time() - result.duration, result.duration,
+                 result.status, result.category, result.failed_step, result.attempts,
+                 json.dumps(result.trace) if result.trace else None),
+            )
+
+    def recorded(self, run_id: str, plan: str) -> bool:
+        """Whether an outcome of the plan is already stored for the run."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT 1 FROM plan_runs WHERE run_id = ? AND plan = ? LIMIT 1", (run_id, plan)).fetchone()
+        return row is not None
+
+    def outcomes(self, plan: str, limit: int = 10) -> list[str]:
+        """Return the plan's final outcome in each of its most recent runs, newest first.
+
+        Retries within a run are stored as separate attempts; only the last
+        attempt of each run counts.
+        """
+        with closing(self._connect()) as conn:
+            # SQLite takes the bare outcome column from the row with MAX(started_at)
+            rows = conn.execute(
+                "SELECT outcome, MAX(started_at) AS last_started FROM plan_runs "
+                "WHERE plan = ? AND outcome IN ('PASS', 'FAIL') "
+                "GROUP BY run_id ORDER BY last_started DESC LIMIT ?",
+                (plan, limit),
+            ).fetchall()
+        return [outcome for outcome, _ in rows]
+
+    def stats(self, plans: list[str]) -> dict[str, PlanStats]:
+        """Summarize the history of each plan."""
+        result = {plan: PlanStats() for plan in plans}
+        with closing(self._connect()) as conn:
+            for plan in plans:
+                rows = conn.execute(
+                    "SELECT outcome, duration FROM plan_runs WHERE plan = ? AND outcome IN ('PASS', 'FAIL') "
+                    "ORDER BY started_at DESC LIMIT ?",
+                    (plan, DURATION_WINDOW),
+                ).fetchall()
+                if rows:
+                    result[plan] = PlanStats(
+                        runs=len(rows),
+                        last_outcome=rows[0][0],
+                        expected_duration=statistics.fmean(duration for _, duration in rows),
+                    )
+        return result
+
+
+def is_flaky(outcomes: list[str]) -> bool:
+    """Whether per-run outcomes alternate between PASS and FAIL often enough to be flaky."""
+    window = outcomes[:FLAKY_WINDOW]
+    flips = sum(1 for a, b in zip(window, window[1:]) if a != b)
+    return flips >= FLAKY_MIN_FLIPS
+
+
+def classify_failure(plan: str, history: ResultsHistory) -> str:
+    """Classify a fresh failure against the plan's earlier outcomes.
+
+    Must be called before the failure itself is recorded.
+
+    Returns:
+        "flaky" if the plan alternates outcomes, "new" if it passed last
+        time, "persistent" if it has failed every recent run, and "unknown"
+        without enough history.
+    """
+    outcomes = history.outcomes(plan, FLAKY_WINDOW)
+    if is_flaky(outcomes):
+        return "flaky"
+    if outcomes and outcomes[0] == "PASS":
+        return "new"
+    if len(outcomes) >= PERSISTENT_FAILURES and all(o == "FAIL" for o in outcomes[:PERSISTENT_FAILURES]):
+        return "persistent"
+    return "unknown"
+
+
+def should_retry(classification: str, result: PlanResult) -> bool:
+    """Retry flaky and newly broken plans, and infrastructure failures that are not persistent."""
+    if classification in ("flaky", "new"):
+        return True
+    return classification == "unknown" and result.category == "ENVIRONMENT"
+
+
+def _durations(plans: list[str], stats: dict[str, PlanStats]) -> dict[str, float]:
+    """Estimate the duration of each plan, using the median of known plans for unknown ones."""
+    known = [s.expected_duration for s in stats.values() if s.expected_duration is not None]
+    fallback = statistics.median(known) if known else DEFAULT_DURATION
+    return {plan: stats[plan].expected_duration or fallback for plan in plans}
+
+
+def order_plans(plans: list[str], history: ResultsHistory) -> list[str]:
+    """Order plans for fast feedback.
+
+    Plans that failed last time run first, then plans that were never run,
+    then the rest shortest-first so passing results arrive as early as possible.
+    """
+    stats = history.stats(plans)
+    durations = _durations(plans, stats)
+    return sorted(plans, key=lambda p: (not stats[p].recently_failed, stats[p].runs > 0, durations[p], p))
+
+
+def longest_first(plans: list[str], history: ResultsHistory) -> list[str]:
+    """Order plans by expected duration, longest first.
+
+    The order to enqueue plans in when idle workers pull the next one
+    themselves: the long plans start early and the short ones fill the gaps.
+    """
+    durations = _durations(plans, history.stats(plans))
+    return sorted(plans, key=lambda p: (-durations[p], p))
+
+
+def shard_plans(plans: list[str], workers: int, history: ResultsHistory) -> list[list[str]]:
+    """Split plans across workers with the longest-processing-time-first heuristic.
+
+    Each plan goes, longest first, to the worker with the least expected
+    work so far. Each shard is then put in fast-feedback order.
+    """
+    stats = history.stats(plans)
+    durations = _durations(plans, stats)
+    loads = [(0.0, index) for index in range(max(1, workers))]
+    shards: list[list[str]] = [[] for _ in loads]
+    for plan in sorted(plans, key=lambda p: (-durations[p], p)):
+        load, index = heapq.heappop(loads)
+        shards[index].append(plan)
+        heapq.heappush(loads, (load + durations[plan], index))
+    return [order_plans(shard, history) for shard in shards if shard]
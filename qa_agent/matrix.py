@@ -0,0 +1,157 @@
+"""Matrix runs: the same test plans across several targets and browser profiles.
+
+A matrix is the cross product of target URLs (e.g. a staging and a preview
+deployment) and browser profiles (browser engine plus viewport size or
+device emulation). Plans are written once against TEST_APP_URL; every cell
+then runs them at the same time, against its own target, on a session from
+its profile's browser pool. Results carry their cell, so one report covers
+the whole matrix.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from qa_agent.executor import run_plans
+from qa_agent.playwright_mcp import get_browser_pool
+from qa_agent.results import PlanResult
+from qa_agent.workspace import TEST_APP_URL, cell_scope
+
+MATRIX_TARGETS = os.environ.get("QA_MATRIX_TARGETS", "")  # comma-separated URLs, optionally name=URL
+MATRIX_PROFILES = os.environ.get("QA_MATRIX_PROFILES", "")  # comma-separated browser[:WIDTHxHEIGHT|device]
+
+_VIEWPORT_RE = re.compile(r"^(\d+)x(\d+)$")
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _slug(text: str) -> str:
+    return _UNSAFE_RE.sub("-", text).strip("-")
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    """Browser engine and viewport (or emulated device) for Playwright MCP."""
+
+    browser: str = ""  # e.g. chromium, chrome, firefox, webkit ("" = Playwright MCP default)
+    viewport: str = ""  # WIDTHxHEIGHT
+    device: str = ""  # Playwright device name, e.g. "iPhone 15"
+
+    @property
+    def name(self) -> str:
+        return _slug("-".join(part for part in (self.browser, self.viewport, self.device) if part)) or "default"
+
+    def args(self) -> tuple[str, ...]:
+        """Playwright MCP arguments that launch this profile."""
+        args = []
+        if self.browser:
+            args += ["--browser", self.browser]
+        if self.device:
+            args += ["--device", self.device]
+        elif self.viewport:
+            args += ["--viewport-size", self.viewport]
+        return tuple(args)
+
+
+def parse_profile(spec: str) -> BrowserProfile:
+    """Parse ``browser[:WIDTHxHEIGHT|device]``, e.g. ``firefox:1280x720`` or ``webkit:iPhone 15``."""
+    browser, _, screen = (part.strip() for part in spec.partition(":"))
+    if _VIEWPORT_RE.match(screen):
+        return BrowserProfile(browser=browser, viewport=screen)
+    return BrowserProfile(browser=browser, device=screen)
+
+
+@dataclass(frozen=True)
+class MatrixCell:
+    """One target URL run with one browser profile."""
+
+    target: str
+    profile: BrowserProfile
+    target_name: str = ""
+
+    @property
+    def name(self) -> str:
+        parts = urlsplit(self.target)
+        target = self.target_name or _slug(parts.netloc + parts.path.rstrip("/"))
+        return f"{target}_{self.profile.name}"
+
+
+def _split(value: str | list[str] | None) -> list[str]:
+    items = value.split(",") if isinstance(value, str) else value or []
+    return [item.strip() for item in items if item.strip()]
+
+
+def build_matrix(targets: str | list[str] | None = None, profiles: str | list[str] | None = None) -> list[MatrixCell]:
+    """Build the cells of a matrix run.
+
+    Args:
+        targets: Target URLs, optionally ``name=URL`` (default: QA_MATRIX_TARGETS,
+            or TEST_APP_URL if only profiles are given)
+        profiles: Browser profile specs (see ``parse_profile``; default:
+            QA_MATRIX_PROFILES, or the Playwright MCP defaults if only targets are given)
+
+    Returns:
+        One cell per target and profile, or [] if no matrix is configured
+    """
+    targets, profiles = _split(targets or MATRIX_TARGETS), _split(profiles or MATRIX_PROFILES)
+    if not targets and not profiles:
+        return []
+
+    named_targets = []
+    for target in targets or [TEST_APP_URL]:
+        name, _, url = target.partition("=") if "=" in target.split("://")[0] else ("", "", target)
+        named_targets.append((_slug(name), url))
+    browser_profiles = [parse_profile(spec) for spec in profiles] or [BrowserProfile()]
+    return [
+        MatrixCell(target=url, profile=profile, target_name=name)
+        for name, url in named_targets
+        for profile in browser_profiles
+    ]
+
+
+def run_matrix(
+    plans: list[str],
+    run_id: str,
+    cells: list[MatrixCell],
+    workers: int = 1,
+    fail_fast: bool = False,
+    cancel: threading.Event | None = None,
+) -> list[PlanResult]:
+    """Execute the same plans in every cell of a matrix at once.
+
+    Each cell runs on sessions from its profile's browser pool (see
+    ``run_plans``), so cells sharing a profile share up to
+    QA_BROWSER_POOL_SIZE sessions and wait for one beyond that.
+
+    Args:
+        plans: Plan names to execute
+        run_id: Identifier the outcomes are recorded under
+        cells: Matrix cells (see ``build_matrix``)
+        workers: Number of plans each cell executes concurrently
+        fail_fast: After the first failure in any cell, stop starting new plans in all of them
+        cancel: Set by the caller to stop starting new plans, like fail-fast
+
+    Returns:
+        Results of all cells, grouped by cell in matrix order
+    """
+    if not plans or not cells:
+        return []
+    stop = cancel or threading.Event()
+
+    def run_cell(cell: MatrixCell) -> list[PlanResult]:
+        print(f"🧩 {cell.name}: {cell.target} ({' '.join(cell.profile.args()) or 'default browser'})")
+        with cell_scope(cell.name, cell.target):
+            results = run_plans(
+                plans, run_id, workers=workers, fail_fast=fail_fast, cancel=stop,
+                pool=get_browser_pool(cell.profile.args()),
+            )
+        for result in results:
+            result.cell = cell.name
+        return results
+
+    print(f"Running {len(plans)} tests in {len(cells)} matrix cells")
+    with ContextThreadPoolExecutor(max_workers=len(cells)) as executor:
+        return [result for results in executor.map(run_cell, cells) for result in results]
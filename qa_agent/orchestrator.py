@@ -1,10 +1,38 @@
-from typing import Literal, Annotated, TypedDict
+import json
+import threading
+from dataclasses import asdict
+from functools import wraps
+from typing import Callable, Iterator, Literal, Annotated, TypedDict
+from langgraph.config import get_config
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langchain_core.messages import HumanMessage, BaseMessage, AIMessage
-
-from qa_agent.workspace import init_workspace, get_path, get_test_app_url
-from qa_agent.agents import create_planner_agent, create_runner_agent
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from qa_agent.workspace import (
+    agent_path,
+    atomic_write_text,
+    init_workspace,
+    get_path,
+    get_run_id,
+    get_test_app_url,
+    new_run_id,
+    publish_report,
+    run_scope,
+    WORKSPACE_ROOT,
+)
+from qa_agent.agents import create_planner_agent
+from qa_agent.crawler import crawl_site, area_summary
+from qa_agent.events import emit
+from qa_agent.executor import RUNNER_WORKERS, run_plans
+from qa_agent.matrix import MatrixCell, build_matrix, run_matrix
+from qa_agent.plan_index import get_plan_index
+from qa_agent.plans import list_plans, select_plans
+from qa_agent.preflight import PREFLIGHT_ENABLED, run_preflight
+from qa_agent.results import PlanResult, save_results, summarize_results, write_report
+from qa_agent.usage import get_run_usage, usage_scope
+from qa_agent.worker import dispatch_plans
+from qa_agent.playwright_mcp import get_browser_pool
 
 init_workspace()
 
@@ -14,6 +42,16 @@ class WorkflowState(TypedDict, total=False):
     task_type: Literal["plan", "run", "full"]
     wrike_enabled: bool
     wrike_task_id: str
+    site_map: dict
+    workers: int
+    fail_fast: bool
+    run_id: str
+    distributed: bool
+    queue_url: str
+    preflight: dict
+    targets: list[str]
+    profiles: list[str]
+    pooled: bool
 
 
 def get_user_input(state: WorkflowState) -> str:
@@ -24,17 +62,33 @@ def get_user_input(state: WorkflowState) -> str:
     return ""
 
 
-def route_task(state: WorkflowState) -> Literal["planner", "runner"]:
+def _matrix(state: WorkflowState) -> list[MatrixCell]:
+    return build_matrix(state.get("targets"), state.get("profiles"))
+
+
+def _execution_node(state: WorkflowState) -> Literal["runner", "coordinator"]:
+    # Matrix runs need per-cell targets and browser profiles, so they always run here
+    return "coordinator" if state.get("distributed") and not _matrix(state) else "runner"
+
+
+def route_task(state: WorkflowState) -> Literal["crawler", "runner", "coordinator"]:
     task_type = state.get("task_type", "full")
     if task_type == "run":
-        return "runner"
-    return "planner"
+        return _execution_node(state)
+    return "crawler"
+
+
+def after_preflight(state: WorkflowState) -> Literal["crawler", "runner", "coordinator", "end"]:
+    """Stop the workflow if the pre-flight check found the app down."""
+    if not state.get("preflight", {}).get("ok", True):
+        return "end"
+    return route_task(state)
 
 
-def should_continue(state: WorkflowState) -> Literal["runner", "end"]:
+def should_continue(state: WorkflowState) -> Literal["runner", "coordinator", "end"]:
     task_type = state.get("task_type", "full")
     if task_type == "full":
-        return "runner"
+        return _execution_node(state)
     return "end"
 
 
@@ -46,47 +100,175 @@ def should_post_to_wrike(state: WorkflowState) -> Literal["wrike_poster", "end"]
     return "end"
 
 
-def plan_tests(state: WorkflowState) -> dict:
-    agent = create_planner_agent()
-    plans_dir = get_path("plans")
+def run_scoped(node: Callable[[WorkflowState], dict]) -> Callable[[WorkflowState], dict]:
+    """Run a node inside its run's workspace scope (runs/<run_id>/).
+    
+    The first node of a run without a ``run_id`` allocates one and stores it
+    in the state for the nodes that follow. LLM usage inside the node is
+    attributed to it.
+    """
+    @wraps(node)
+    def scoped(state: WorkflowState) -> dict:
+        run_id = state.get("run_id") or new_run_id()
+        node_name = get_config().get("metadata", {}).get("langgraph_node", node.__name__)
+        with run_scope(run_id), usage_scope(node=node_name):
+            update = node(state)
+        return {"run_id": run_id, **update}
+    return scoped
+
+
+@run_scoped
+def preflight_check(state: WorkflowState) -> dict:
+    """Smoke-check the app (HTTP, one page load, console) before any LLM work."""
+    if not PREFLIGHT_ENABLED:
+        return {}
+    # Planning runs against TEST_APP_URL, a matrix run against each of its targets
+    cells = _matrix(state)
+    urls = [get_test_app_url()] if state.get("task_type") != "run" or not cells else []
+    urls = list(dict.fromkeys(urls + [cell.target for cell in cells]))
+    checks = []
+    for url in urls:
+        checks.append(run_preflight(url))
+        emit("preflight", **asdict(checks[-1]))
+        if not checks[-1].ok:
+            break
+    result = checks[-1]
+    report = asdict(result) if len(urls) == 1 else [asdict(check) for check in checks]
+    atomic_write_text(get_path("reports") / "preflight.json", json.dumps(report, indent=2))
+    update = {"preflight": asdict(result)}
+    if not result.ok:
+        lines = [
+            f"❌ ENVIRONMENT failure: {result.url} is not usable, no tests were planned or run.",
+            "",
+            f"Failed check: {result.stage}",
+            f"Details: {result.details}",
+        ]
+        lines += [f"Console error: {error}" for error in result.console_errors]
+        update["messages"] = [AIMessage(content="\n".join(lines))]
+    return update
+
+
+@run_scoped
+def crawl_app(state: WorkflowState) -> dict:
+    """Map the app's routes without the LLM so planning can be partitioned."""
+    try:
+        return {"site_map": crawl_site(get_test_app_url())}
+    except Exception as e:
+        print(f"Warning: Site crawl failed, planner will explore on its own: {e}")
+        return {"site_map": {}}
+
+
+def _invoke_planner(user_input: str, site_summary: str = "", client=None):
+    agent = create_planner_agent(client)
     test_url = get_test_app_url()
-    user_input = get_user_input(state)
+    site_section = f"\nSITE MAP:\n{site_summary}\n" if site_summary else ""
     
+    # Fixed instruction first, run-specific values last (see get_planner_prompt)
     result = agent.invoke({
-        "messages": [HumanMessage(content=f"""
+        "messages": [HumanMessage(content=f"""Create test scenarios based on the user's request below.
+Save each test to: {agent_path(get_path("plans"))}/<test_name>.md
+
 TARGET APPLICATION: {test_url}
 
 USER REQUEST: {user_input if user_input else "Explore and create test scenarios for all features"}
-
-Create test scenarios based on the user's request above.
-Save each test to: {plans_dir}/<test_name>.md
-""")]
+{site_section}""")]
     })
-    return {"messages": [result["messages"][-1]]}
+    return result["messages"][-1]
 
 
-def run_tests(state: WorkflowState) -> dict:
-    agent = create_runner_agent()
-    plans_dir = get_path("plans")
-    reports_dir = get_path("reports")
-    test_url = get_test_app_url()
+def _plan_area(user_input: str, site_map: dict, area: str):
+    with get_browser_pool().acquire() as client:
+        return _invoke_planner(user_input, area_summary(site_map, area), client)
+
+
+@run_scoped
+def plan_tests(state: WorkflowState) -> dict:
     user_input = get_user_input(state)
+    site_map = state.get("site_map") or {}
+    areas = list(site_map.get("areas", {}))
     
-    result = agent.invoke({
-        "messages": [HumanMessage(content=f"""
-TARGET APPLICATION: {test_url}
+    if len(areas) <= 1:
+        summary = area_summary(site_map, areas[0]) if areas else ""
+        if state.get("pooled"):
+            with get_browser_pool().acquire() as client:
+                content = _invoke_planner(user_input, summary, client).content
+        else:
+            content = _invoke_planner(user_input, summary).content
+    else:
+        # One sub-agent per feature area, each on its own pooled browser
+        print(f"Planning {len(areas)} feature areas in parallel: {', '.join(areas)}")
+        with ContextThreadPoolExecutor(max_workers=get_browser_pool().size) as executor:
+            results = list(executor.map(lambda area: _plan_area(user_input, site_map, area), areas))
+        content = "\n\n".join(f"[{area}] {msg.content}" for area, msg in zip(areas, results))
+    
+    if state.get("task_type") == "plan":
+        content = _with_usage(content)
+    return {"messages": [AIMessage(content=content)]}
 
-USER REQUEST: {user_input if user_input else "Run all available tests"}
 
-Test files location: {plans_dir}
-Save report to: {reports_dir}/test_report.md
+def _selected_plans(state: WorkflowState) -> list[str]:
+    """Plans to execute: the ones named in a run request, or the ones this run's planner produced."""
+    plans = list_plans()
+    if state.get("task_type") == "run":
+        return select_plans(get_user_input(state), plans)
+    planned = set(get_plan_index().planned(get_run_id()))
+    if not planned:
+        print("Warning: The planner saved no test plans in this run, nothing to execute")
+    return [name for name in plans if name in planned]
 
-Execute tests based on the user's request above.
-""")]
-    })
-    return {"messages": [result["messages"][-1]]}
 
+def _cancel_event() -> threading.Event | None:
+    """Return the cancel event ``stream_workflow`` passes in the run config, if any."""
+    return get_config().get("configurable", {}).get("cancel")
 
+
+def _with_usage(content: str) -> str:
+    """Append the run's LLM usage summary to a message."""
+    summary = get_run_usage().summary()
+    return f"{content}\n\n{summary}" if summary else content
+
+
+def _report_results(results: list[PlanResult]) -> dict:
+    usage = get_run_usage()
+    screenshots_ref = get_path("screenshots").relative_to(WORKSPACE_ROOT).as_posix()
+    diffs_ref = get_path("visual_diffs").relative_to(WORKSPACE_ROOT).as_posix()
+    report_path = write_report(results, get_path("reports") / "test_report.md", screenshots_ref, usage, diffs_ref)
+    atomic_write_text(get_path("reports") / "usage.json", json.dumps(usage.to_dict(), indent=2))
+    save_results(results, get_path("reports") / "results.json")
+    publish_report(report_path)
+    return {"messages": [AIMessage(content=_with_usage(summarize_results(results, report_path)))]}
+
+
+@run_scoped
+def run_tests(state: WorkflowState) -> dict:
+    plans = _selected_plans(state)
+    options = {
+        "run_id": get_run_id(),
+        "workers": state.get("workers") or RUNNER_WORKERS,
+        "fail_fast": state.get("fail_fast", False),
+        "cancel": _cancel_event(),
+    }
+    cells = _matrix(state)
+    if state.get("pooled") and not cells:
+        options["pool"] = get_browser_pool()
+    results = run_matrix(plans, cells=cells, **options) if cells else run_plans(plans, **options)
+    return _report_results(results)
+
+
+@run_scoped
+def coordinate_tests(state: WorkflowState) -> dict:
+    """Hand plans to queue workers (``python -m qa_agent worker``) and merge their results."""
+    results = dispatch_plans(
+        _selected_plans(state),
+        run_id=get_run_id(),
+        queue_url=state.get("queue_url"),
+        fail_fast=state.get("fail_fast", False),
+        cancel=_cancel_event(),
+    )
+    return _report_results(results)
+
+
+@run_scoped
 def post_to_wrike(state: WorkflowState) -> dict:
     """Post QA results to Wrike as a final step in the workflow."""
     from qa_agent.wrike_integration import post_qa_results_to_wrike
@@ -126,7 +308,7 @@ def post_to_wrike(state: WorkflowState) -> dict:
             msg = f"⚠️ Wrike posting completed with status: {status}"
         
         print(msg)
-        return {"messages": [AIMessage(content=msg)]}
+        return {"messages": [AIMessage(content=_with_usage(msg))]}
         
     except Exception as e:
         error_msg = f"❌ Error posting to Wrike: {str(e)}"
@@ -137,13 +319,25 @@ def post_to_wrike(state: WorkflowState) -> dict:
 def create_qa_workflow():
     workflow = StateGraph(WorkflowState)
     
+    workflow.add_node("preflight", preflight_check)
+    workflow.add_node("crawler", crawl_app)
     workflow.add_node("planner", plan_tests)
     workflow.add_node("runner", run_tests)
+    workflow.add_node("coordinator", coordinate_tests)
     workflow.add_node("wrike_poster", post_to_wrike)
     
-    workflow.add_conditional_edges(START, route_task, {"planner": "planner", "runner": "runner"})
-    workflow.add_conditional_edges("planner", should_continue, {"runner": "runner", "end": END})
+    workflow.add_edge(START, "preflight")
+    workflow.add_conditional_edges(
+        "preflight",
+        after_preflight,
+        {"crawler": "crawler", "runner": "runner", "coordinator": "coordinator", "end": END},
+    )
+    workflow.add_edge("crawler", "planner")
+    workflow.add_conditional_edges(
+        "planner", should_continue, {"runner": "runner", "coordinator": "coordinator", "end": END}
+    )
     workflow.add_conditional_edges("runner", should_post_to_wrike, {"wrike_poster": "wrike_poster", "end": END})
+    workflow.add_conditional_edges("coordinator", should_post_to_wrike, {"wrike_poster": "wrike_poster", "end": END})
     workflow.add_edge("wrike_poster", END)
     
     return workflow.compile()
@@ -152,45 +346,195 @@ def create_qa_workflow():
 graph = create_qa_workflow()
 
 
-def run_planner(message: str = "") -> str:
-    """Run only the planner agent."""
+def run_planner(message: str = "", pooled: bool = False) -> str:
+    """Run only the planner agent.
+    
+    Args:
+        message: Optional message to customize the planning
+        pooled: Use pooled browser sessions only, never the shared global one
+            (for concurrent callers such as the QA service)
+    """
     init_workspace()
     result = graph.invoke({
+        "run_id": new_run_id(),
         "task_type": "plan",
         "messages": [HumanMessage(content=message)] if message else [],
-        "wrike_enabled": False
+        "wrike_enabled": False,
+        "pooled": pooled,
     })
     return result["messages"][-1].content if result.get("messages") else ""
 
 
-def run_runner() -> str:
-    """Run only the runner agent (assumes test plans exist)."""
+def run_runner(
+    workers: int = None,
+    fail_fast: bool = False,
+    distributed: bool = False,
+    queue_url: str = None,
+    targets: list[str] = None,
+    profiles: list[str] = None,
+    pooled: bool = False,
+) -> str:
+    """Run only the runner agent (assumes test plans exist).
+    
+    Args:
+        workers: Number of tests to run concurrently (default: QA_RUNNER_WORKERS)
+        fail_fast: Stop starting new tests after the first failure
+        distributed: Hand tests to queue workers instead of running them here
+        queue_url: Work queue for distributed runs (default: QA_QUEUE_URL)
+        targets: Run the tests against each of these URLs (matrix run, default: QA_MATRIX_TARGETS)
+        profiles: Run the tests in each of these browser profiles, e.g. ``chromium:1280x720``
+            or ``webkit:iPhone 15`` (matrix run, default: QA_MATRIX_PROFILES)
+        pooled: Use pooled browser sessions only, never the shared global one
+            (for concurrent callers such as the QA service)
+    """
     init_workspace()
     result = graph.invoke({
+        "run_id": new_run_id(),
         "task_type": "run",
         "messages": [],
-        "wrike_enabled": False
+        "wrike_enabled": False,
+        "workers": workers or RUNNER_WORKERS,
+        "fail_fast": fail_fast,
+        "distributed": distributed,
+        "queue_url": queue_url,
+        "targets": targets,
+        "profiles": profiles,
+        "pooled": pooled,
     })
     return result["messages"][-1].content if result.get("messages") else ""
 
 
-def run_full(message: str = "", post_to_wrike: bool = False, wrike_task_id: str = None) -> str:
+def run_full(
+    message: str = "",
+    post_to_wrike: bool = False,
+    wrike_task_id: str = None,
+    workers: int = None,
+    fail_fast: bool = False,
+    distributed: bool = False,
+    queue_url: str = None,
+    targets: list[str] = None,
+    profiles: list[str] = None,
+    pooled: bool = False,
+) -> str:
     """Run full workflow: planner -> runner -> (optionally) wrike poster.
     
     Args:
         message: Optional message to customize the QA run
         post_to_wrike: Whether to post results to Wrike (demo mode)
         wrike_task_id: Wrike task ID to post to (e.g., "EXPRESS-2024-001")
+        workers: Number of tests to run concurrently (default: QA_RUNNER_WORKERS)
+        fail_fast: Stop starting new tests after the first failure
+        distributed: Hand tests to queue workers instead of running them here
+        queue_url: Work queue for distributed runs (default: QA_QUEUE_URL)
+        targets: Run the tests against each of these URLs (matrix run, default:
+            QA_MATRIX_TARGETS). Planning runs once, against TEST_APP_URL
+        profiles: Run the tests in each of these browser profiles, e.g.
+            ``chromium:1280x720`` or ``webkit:iPhone 15`` (matrix run, default: QA_MATRIX_PROFILES)
+        pooled: Use pooled browser sessions only, never the shared global one
+            (for concurrent callers such as the QA service)
     
     Returns:
         Final message content from the workflow
     """
     init_workspace()
     result = graph.invoke({
+        "run_id": new_run_id(),
         "task_type": "full",
         "messages": [HumanMessage(content=message)] if message else [],
         "wrike_enabled": post_to_wrike,
-        "wrike_task_id": wrike_task_id or "DEMO-TASK-001"
+        "wrike_task_id": wrike_task_id or "DEMO-TASK-001",
+        "workers": workers or RUNNER_WORKERS,
+        "fail_fast": fail_fast,
+        "distributed": distributed,
+        "queue_url": queue_url,
+        "targets": targets,
+        "profiles": profiles,
+        "pooled": pooled,
     })
     
     return result["messages"][-1].content if result.get("messages") else ""
+
+
+def stream_workflow(
+    task_type: Literal["plan", "run", "full"] = "full",
+    message: str = "",
+    post_to_wrike: bool = False,
+    wrike_task_id: str = None,
+    workers: int = None,
+    fail_fast: bool = False,
+    distributed: bool = False,
+    queue_url: str = None,
+    targets: list[str] = None,
+    profiles: list[str] = None,
+    pooled: bool = False,
+    cancel: threading.Event = None,
+    cancel_on: Callable[[dict], bool] = None,
+) -> Iterator[dict]:
+    """Run the workflow and yield progress events as they happen.
+    
+    Events are dicts with a ``type``:
+    
+    - ``node_start`` / ``node_end``: a workflow node (``node``) started or finished
+    - ``tool_call``: a browser tool (``tool``) was called, ``error`` if it failed
+    - ``preflight``: the pre-flight check finished (``ok``, ``stage``, ``details``, ...)
+    - ``test_result``: a test finished (``plan``, ``cell`` in matrix runs, ``status``, ``category``, ``details``, ...)
+    - ``cancelled``: the run was cancelled; tests not yet started are skipped
+    - ``done``: the workflow finished, with its final ``message``
+    
+    Setting ``cancel`` (or closing the generator) stops the runner from
+    starting further tests; the report covers the tests that ran.
+    
+    Args:
+        task_type: "plan", "run" or "full", as for ``run_planner``/``run_runner``/``run_full``
+        cancel_on: Called with each event; cancel the run when it returns True
+            (e.g. on the first critical test failure)
+        Other arguments as for ``run_full``.
+    """
+    init_workspace()
+    cancel = cancel or threading.Event()
+    state = {
+        "run_id": new_run_id(),
+        "task_type": task_type,
+        "messages": [HumanMessage(content=message)] if message else [],
+        "wrike_enabled": post_to_wrike,
+        "wrike_task_id": wrike_task_id or "DEMO-TASK-001",
+        "workers": workers or RUNNER_WORKERS,
+        "fail_fast": fail_fast,
+        "distributed": distributed,
+        "queue_url": queue_url,
+        "targets": targets,
+        "profiles": profiles,
+        "pooled": pooled,
+    }
+    final_message = ""
+    try:
+        stream = graph.stream(
+            state,
+            {"configurable": {"cancel": cancel}},
+            stream_mode=["tasks", "custom", "values"],
+            subgraphs=True,
+        )
+        for namespace, mode, data in stream:
+            if mode == "custom":
+                event = data
+            elif namespace:
+                # Tasks and state of the agents running inside a node
+                continue
+            elif mode == "values":
+                if data.get("messages"):
+                    final_message = data["messages"][-1].content
+                continue
+            elif "result" in data:
+                event = {"type": "node_end", "node": data["name"], "error": str(data["error"]) if data.get("error") else None}
+            else:
+                event = {"type": "node_start", "node": data["name"]}
+            
+            yield event
+            if cancel_on and not cancel.is_set() and cancel_on(event):
+                cancel.set()
+                yield {"type": "cancelled", "reason": event}
+    except GeneratorExit:
+        # The caller stopped reading, don't start further tests
+        cancel.set()
+        raise
+    yield {"type": "done", "message": final_message}
@@ -0,0 +1,244 @@
+"""Similarity index over the test plan corpus.
+
+Plans are reduced to shingles of their normalized steps and expected
+results, then to MinHash signatures, so near-duplicate scenarios can be
+detected when the planner saves a plan and clustered after the fact.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from qa_agent.workspace import get_path, get_run_id
+
+SIMILARITY_THRESHOLD = float(os.environ.get("QA_PLAN_SIMILARITY_THRESHOLD", "0.8"))
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 3
+INDEX_FILENAME = ".plan_index.json"
+INDEX_VERSION = 2  # bump when normalize() changes, so cached signatures are rebuilt
+DUPLICATES_DIRNAME = ".duplicates"
+MAX_TRACKED_RUNS = 64  # runs whose planned plans stay in memory (long-lived service)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME)
+    for i in range(NUM_PERMUTATIONS)
+]
+
+_SECTION_RE = re.compile(r"^##\s+(.+?)\s*$", re.M)
+_COMPARED_SECTIONS = ("test steps", "expected results")
+
+
+def _compared_text(content: str) -> str:
+    """Return the parts of a plan that define the scenario (steps and expectations)."""
+    parts = _SECTION_RE.split(content)
+    # parts = [preamble, title1, body1, title2, body2, ...]
+    sections = [body for title, body in zip(parts[1::2], parts[2::2]) if title.lower() in _COMPARED_SECTIONS]
+    return "\n".join(sections) if sections else content
+
+
+def normalize(content: str) -> list[str]:
+    """Lowercase, drop numbering, punctuation and hosts; keep input and assertion literals.
+
+    Literals are what tell boundary and negative variants of a scenario apart,
+    so quoted values and numbers stay in the words.
+    """
+    text = _compared_text(content).lower()
+    text = re.sub(r"^\s*(\d+[.)]|[-*])\s*", "", text, flags=re.M)
+    text = re.sub(r"https?://[^/\s]+", " url ", text)
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def shingles(content: str) -> set[str]:
+    """Build the set of word shingles for a plan."""
+    words = normalize(content)
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set: set[str]) -> list[int]:
+    """Compute the MinHash signature of a shingle set."""
+    if not shingle_set:
+        return [_MAX_HASH] * NUM_PERMUTATIONS
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingle_set]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a: list[int], sig_b: list[int]) -> float:
+    """Estimate Jaccard similarity from two MinHash signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERMUTATIONS
+
+
+@dataclass
+class PlanDecision:
+    """What to do with a plan that is about to be saved."""
+
+    action: str  # "write" or "skip"
+    match: str = ""
+    score: float = 0.0
+
+
+class PlanIndex:
+    """MinHash index of the plans directory, cached on disk by file mtime."""
+
+    def __init__(self, plans_dir: Path | None = None, threshold: float = SIMILARITY_THRESHOLD):
+        self.plans_dir = plans_dir or get_path("plans")
+        self.threshold = threshold
+        self.lock = threading.RLock()
+        self._entries: dict[str, dict] = {}
+        self._planned: OrderedDict[str | None, set[str]] = OrderedDict()
+        self._load()
+
+    @property
+    def _index_path(self) -> Path:
+        return self.plans_dir / INDEX_FILENAME
+
+    def _load(self):
+        try:
+            data = json.loads(self._index_path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        self._entries = data.get("entries", {}) if data.get("version") == INDEX_VERSION else {}
+
+    def _save(self):
+        self.plans_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"version": INDEX_VERSION, "entries": self._entries}))
+        os.replace(tmp_path, self._index_path)
+
+    def refresh(self):
+        """Re-index plans that were added, changed or removed since the last scan."""
+        with self.lock:
+            current = {p.stem: p for p in self.plans_dir.glob("*.md")}
+            changed = False
+            for name in list(self._entries):
+                if name not in current:
+                    del self._entries[name]
+                    changed = True
+            for name, path in current.items():
+                mtime = path.stat().st_mtime
+                entry = self._entries.get(name)
+                if entry and entry["mtime"] == mtime:
+                    continue
+                shingle_set = shingles(path.read_text())
+                self._entries[name] = {"mtime": mtime, "size": len(shingle_set), "signature": minhash(shingle_set)}
+                changed = True
+            if changed:
+                self._save()
+
+    def mark_planned(self, name: str):
+        """Record that the current run's planner wrote or kept plan ``name``."""
+        run_id = get_run_id()
+        with self.lock:
+            self._planned.setdefault(run_id, set()).add(name)
+            self._planned.move_to_end(run_id)
+            while len(self._planned) > MAX_TRACKED_RUNS:
+                self._planned.popitem(last=False)
+
+    def planned(self, run_id: str | None) -> list[str]:
+        """Plans the planner of ``run_id`` wrote or kept (see ``mark_planned``)."""
+        with self.lock:
+            return sorted(self._planned.get(run_id, ()))
+
+    def query(self, content: str, exclude: str = "") -> list[tuple[str, float]]:
+        """Return indexed plans similar to ``content``, most similar first."""
+        signature = minhash(shingles(content))
+        with self.lock:
+            self.refresh()
+            scores = [
+                (name, similarity(signature, entry["signature"]))
+                for name, entry in self._entries.items()
+                if name != exclude
+            ]
+        return sorted((s for s in scores if s[1] >= self.threshold), key=lambda s: s[1], reverse=True)
+
+    def check(self, content: str, exclude: str = "") -> PlanDecision:
+        """Decide whether a new plan should be written or skipped as a near-duplicate.
+
+        A near-duplicate that covers more steps than the existing plan is
+        written alongside it (``match`` names the existing plan, which is never
+        overwritten; ``dedupe_plans`` retires it later); otherwise it is skipped.
+        """
+        matches = self.query(content, exclude)
+        if not matches:
+            return PlanDecision("write")
+        name, score = matches[0]
+        if len(shingles(content)) > self._entries[name]["size"]:
+            return PlanDecision("write", name, score)
+        return PlanDecision("skip", name, score)
+
+    def clusters(self) -> list[list[str]]:
+        """Group plans into clusters of near-duplicates (singletons omitted)."""
+        with self.lock:
+            self.refresh()
+            names = sorted(self._entries)
+            parent = {name: name for name in names}
+
+            def find(name: str) -> str:
+                while parent[name] != name:
+                    parent[name] = parent[parent[name]]
+                    name = parent[name]
+                return name
+
+            for i, a in enumerate(names):
+                for b in names[i + 1:]:
+                    if similarity(self._entries[a]["signature"], self._entries[b]["signature"]) >= self.threshold:
+                        parent[find(b)] = find(a)
+
+            groups: dict[str, list[str]] = {}
+            for name in names:
+                groups.setdefault(find(name), []).append(name)
+            # Most complete plan first: that is the one a dedupe keeps
+            return [
+                sorted(group, key=lambda n: self._entries[n]["size"], reverse=True)
+                for group in groups.values() if len(group) > 1
+            ]
+
+
+_index: PlanIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_plan_index() -> PlanIndex:
+    """Get the shared plan index for the workspace plans directory."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PlanIndex()
+        return _index
+
+
+def dedupe_plans(apply: bool = False) -> list[list[str]]:
+    """Cluster existing plans and optionally retire the redundant ones.
+
+    Args:
+        apply: Move every plan but the most complete one of each cluster into
+            ``plans/.duplicates/`` so the runner no longer executes them
+
+    Returns:
+        Clusters of near-duplicate plan names, the kept plan first.
+    """
+    index = get_plan_index()
+    clusters = index.clusters()
+    for cluster in clusters:
+        keep, *redundant = cluster
+        print(f"{keep}: {len(redundant)} near-duplicate(s): {', '.join(redundant)}")
+        if apply:
+            duplicates_dir = index.plans_dir / DUPLICATES_DIRNAME
+            duplicates_dir.mkdir(exist_ok=True)
+            for name in redundant:
+                shutil.move(index.plans_dir / f"{name}.md", duplicates_dir / f"{name}.md")
+    if apply and clusters:
+        index.refresh()
+    if not clusters:
+        print("No near-duplicate plans found")
+    return clusters
@@ -0,0 +1,167 @@
+"""Structured, pre-compiled test plans.
+
+Alongside the human-readable markdown, the planner emits a ``## Structured
+Steps`` section holding a JSON list of steps. It is validated and compiled
+once when the plan is saved, so the runner can feed the agent one compact
+step at a time, or execute trivially-mappable steps directly, instead of
+re-interpreting the markdown on every run.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, ValidationError, model_validator
+
+from qa_agent.workspace import get_path
+
+COMPILED_DIRNAME = ".compiled"
+
+StepAction = Literal[
+    "navigate", "click", "type", "select", "press", "wait",
+    "assert_text", "assert_visible", "assert_url", "screenshot",
+]
+
+# Which fields each action needs to be executable
+_REQUIRED_FIELDS: dict[str, tuple[str, ...]] = {
+    "navigate": ("target",),
+    "click": ("target",),
+    "type": ("target", "value"),
+    "select": ("target", "value"),
+    "press": ("value",),
+    "wait": ("value",),
+    "assert_text": ("assertion",),
+    "assert_visible": ("target",),
+    "assert_url": ("assertion",),
+    "screenshot": ("value",),
+}
+_ELEMENT_ACTIONS = {"click", "type", "select", "assert_visible"}
+
+ELEMENT_TARGET_RE = re.compile(r'^(\w+) "(.+)"$')
+_STEPS_SECTION_RE = re.compile(r"^##\s+Structured Steps\s*$(.*?)(?=^##\s|\Z)", re.M | re.S | re.I)
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*\n(.*?)```", re.S)
+
+
+class PlanCompileError(ValueError):
+    """Raised when a plan's structured steps are missing or invalid."""
+
+
+class PlanStep(BaseModel):
+    """One executable step of a test plan.
+
+    ``target`` is a URL for ``navigate`` and an accessibility-snapshot locator
+    such as ``button "Save"`` for element actions.
+    """
+
+    action: StepAction
+    target: str | None = None
+    value: str | None = None
+    assertion: str | None = None
+
+    @model_validator(mode="after")
+    def _check_fields(self) -> "PlanStep":
+        missing = [f for f in _REQUIRED_FIELDS[self.action] if not getattr(self, f)]
+        if missing:
+            raise ValueError(f"'{self.action}' step requires {', '.join(missing)}")
+        if self.action in _ELEMENT_ACTIONS and not ELEMENT_TARGET_RE.match(self.target):
+            raise ValueError(f'target must look like: role "Accessible name" (got {self.target!r})')
+        return self
+
+
+class CompiledPlan(BaseModel):
+    """A plan whose steps have been parsed and validated."""
+
+    name: str
+    title: str = ""
+    steps: list[PlanStep]
+
+
+def compile_plan(name: str, markdown: str) -> CompiledPlan | None:
+    """Compile the ``## Structured Steps`` section of a markdown plan.
+
+    Returns:
+        The compiled plan, or None if the plan has no structured section.
+
+    Raises:
+        PlanCompileError: If the section exists but is not a valid step list.
+    """
+    section = _STEPS_SECTION_RE.search(markdown)
+    if not section:
+        return None
+    block = _JSON_BLOCK_RE.search(section.group(1))
+    if not block:
+        raise PlanCompileError("'## Structured Steps' must contain a ```json code block")
+
+    try:
+        raw_steps = json.loads(block.group(1))
+    except ValueError as e:
+        raise PlanCompileError(f"Structured steps are not valid JSON: {e}") from None
+    if not isinstance(raw_steps, list) or not raw_steps:
+        raise PlanCompileError("Structured steps must be a non-empty JSON list")
+
+    steps = []
+    errors = []
+    for number, raw in enumerate(raw_steps, start=1):
+        try:
+            steps.append(PlanStep.model_validate(raw))
+        except ValidationError as e:
+            errors.append(f"step {number}: {'; '.join(err['msg'] for err in e.errors())}")
+    if errors:
+        raise PlanCompileError("Invalid structured steps:\n" + "\n".join(errors))
+
+    title = re.search(r"^#\s+(?:Test:\s*)?(.+)$", markdown, re.M)
+    return CompiledPlan(name=name, title=title.group(1).strip() if title else name, steps=steps)
+
+
+def _compiled_path(name: str) -> Path:
+    return get_path("plans") / COMPILED_DIRNAME / f"{name}.json"
+
+
+def save_compiled(plan: CompiledPlan) -> Path:
+    """Store a compiled plan next to the markdown plans."""
+    path = _compiled_path(plan.name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(plan.model_dump_json(exclude_none=True, indent=2))
+    return path
+
+
+def list_plans() -> list[str]:
+    """List plan names (markdown file stems) in the plans directory."""
+    return sorted(p.stem for p in get_path("plans").glob("*.md"))
+
+
+def select_plans(request: str, names: list[str]) -> list[str]:
+    """Pick the plans a user request refers to by name, or all plans if none are named.
+
+    A plan is named when the request contains its whole name, with underscores
+    written as underscores, hyphens or spaces (``login_test``, ``login test``).
+    """
+    def mentions(name: str) -> bool:
+        # Whole names only: "login" must not pick "login_lockout" or "blogin"
+        words = r"[\s_-]+".join(re.escape(word) for word in re.split(r"[\s_-]+", name) if word)
+        return re.search(rf"(?<![\w-]){words}(?![\w-])", request, re.I) is not None
+
+    named = [n for n in names if mentions(n)]
+    return named or names
+
+
+def load_plan(name: str) -> CompiledPlan | None:
+    """Load the compiled form of a plan, recompiling it if the markdown changed.
+
+    Returns None for free-form plans without structured steps, or whose
+    structured steps no longer compile.
+    """
+    markdown_path = get_path("plans") / f"{name}.md"
+    compiled_path = _compiled_path(name)
+    if compiled_path.exists() and compiled_path.stat().st_mtime >= markdown_path.stat().st_mtime:
+        return CompiledPlan.model_validate_json(compiled_path.read_text())
+
+    try:
+        plan = compile_plan(name, markdown_path.read_text())
+    except PlanCompileError as e:
+        print(f"Warning: Plan {name} has invalid structured steps, running from markdown: {e}")
+        return None
+    if plan:
+        save_compiled(plan)
+    return plan
@@ -1,143 +1,378 @@
 """Playwright MCP integration with persistent browser session.
 
 Uses a dedicated background thread with its own event loop to maintain
-the MCP connection and browser session across all tool calls.
+the MCP connection and browser session across all tool calls. Calls have
+deadlines (per call and, via ``deadline``, per plan), crashed servers are
+reconnected and all servers are shut down at exit.
 """
 
 import os
 import re
+import time
+import atexit
 import shutil
 import asyncio
 import threading
 import queue
+import concurrent.futures
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable, Iterator
 
+import anyio
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from langchain_core.tools import StructuredTool, tool
-from pydantic import create_model, Field
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, create_model, Field
+
+from qa_agent.events import emit
+from qa_agent.tool_output import apply_output_policy
+from qa_agent.traffic import browser_args, close_traffic_proxy
+
+# Pin a version (e.g. @playwright/mcp@0.0.41) so all hosts get the same tools and tool schemas
+PLAYWRIGHT_MCP_PACKAGE = os.environ.get("QA_PLAYWRIGHT_MCP_PACKAGE", "@playwright/mcp@latest")
+MCP_CALL_TIMEOUT = float(os.environ.get("QA_MCP_CALL_TIMEOUT", "120"))
+MCP_CONNECT_TIMEOUT = float(os.environ.get("QA_MCP_CONNECT_TIMEOUT", "60"))
+MCP_STOP_TIMEOUT = 10.0
+
+_deadline: ContextVar[float | None] = ContextVar("mcp_deadline", default=None)
+_saved_screenshots: ContextVar[list[str] | None] = ContextVar("saved_screenshots", default=None)
+
+
+class MCPToolError(RuntimeError):
+    """Raised when an MCP tool call reports an error result."""
+
+
+class MCPTimeoutError(TimeoutError):
+    """Raised when an MCP request misses its call or plan deadline."""
+
+
+class MCPConnectionError(ConnectionError):
+    """Raised when the MCP server could not be started or exited mid-request."""
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Bound all MCP requests made inside the block by one deadline.
+    
+    Nested deadlines keep the earlier one; ``None`` or 0 adds none.
+    """
+    candidates = [_deadline.get(), time.monotonic() + seconds if seconds else None]
+    ends = [end for end in candidates if end is not None]
+    token = _deadline.set(min(ends) if ends else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
 
 
 class MCPBackgroundThread:
-    """Runs MCP client in a dedicated background thread with persistent connection."""
+    """Runs MCP client in a dedicated background thread with persistent connection.
+    
+    Requests run as tasks on the thread's event loop, one at a time. A request
+    that misses its deadline is cancelled and the MCP server restarted (a hung
+    page would otherwise block every later request); after the server exits
+    or crashes, the next request reconnects.
+    """
     
-    def __init__(self):
+    def __init__(self, args: list[str] | None = None):
+        self._args = list(args or [])
         self._thread: threading.Thread | None = None
         self._loop: asyncio.AbstractEventLoop | None = None
         self._session: ClientSession | None = None
-        self._context = None
+        self._connection: concurrent.futures.Future | None = None
+        self._closing: asyncio.Event | None = None
+        self._serial: asyncio.Lock | None = None
+        self._pending: set[concurrent.futures.Future] = set()
         self._ready = threading.Event()
-        self._request_queue = queue.Queue()
-        self._running = False
+        self._lock = threading.RLock()
     
     def start(self):
-        """Start the background thread."""
-        if self._thread is not None:
-            return
+        """Start the background thread and connect, or reconnect after the server exited.
         
-        self._running = True
-        self._thread = threading.Thread(target=self._run_loop, daemon=True)
-        self._thread.start()
-        self._ready.wait(timeout=60)  # Wait for connection
-    
-    def _run_loop(self):
-        """Run the event loop in background thread."""
-        self._loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self._loop)
-        
-        try:
-            self._loop.run_until_complete(self._connect_and_serve())
-        finally:
-            self._loop.close()
+        Raises:
+            MCPConnectionError: The MCP server did not start within QA_MCP_CONNECT_TIMEOUT
+        """
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="mcp-client")
+                self._thread.start()
+            if self._session is not None:
+                return
+            if self._connection is not None:
+                self._disconnect()
+                print("🔄 Playwright MCP session lost, reconnecting")
+            
+            self._ready.clear()
+            self._connection = asyncio.run_coroutine_threadsafe(self._connect_and_serve(), self._loop)
+            if not self._ready.wait(timeout=MCP_CONNECT_TIMEOUT) or self._session is None:
+                error = self._connection.exception() if self._connection.done() else "timed out"
+                self._disconnect()
+                raise MCPConnectionError(f"Could not start Playwright MCP: {error}")
     
     async def _connect_and_serve(self):
-        """Connect to MCP and process requests."""
+        """Connect to MCP and hold the session open until closed or the server exits."""
         server = StdioServerParameters(
             command="npx",
-            args=["@playwright/mcp@latest"],
+            args=[PLAYWRIGHT_MCP_PACKAGE, *self._args, *browser_args()],
             env=os.environ.copy(),
         )
+        self._closing = asyncio.Event()
+        self._serial = asyncio.Lock()
         
-        async with stdio_client(server) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                self._session = session
-                self._ready.set()
-                
-                # Process requests until stopped
-                while self._running:
-                    try:
-                        # Check for requests (non-blocking)
-                        try:
-                            request = self._request_queue.get_nowait()
-                        except queue.Empty:
-                            await asyncio.sleep(0.1)
-                            continue
-                        
-                        method, args, result_queue = request
-                        
-                        try:
-                            if method == "call_tool":
-                                result = await session.call_tool(args["name"], args.get("arguments", {}))
-                                if hasattr(result, 'content'):
-                                    texts = [item.text for item in result.content if hasattr(item, 'text')]
-                                    result_queue.put(("\n".join(texts) if texts else str(result), None))
-                                else:
-                                    result_queue.put((str(result), None))
-                            
-                            elif method == "list_tools":
-                                result = await session.list_tools()
-                                tools = [
-                                    {
-                                        "name": t.name,
-                                        "description": getattr(t, "description", "") or "",
-                                        "inputSchema": getattr(t, "inputSchema", {}) or {},
-                                    }
-                                    for t in result.tools
-                                ]
-                                result_queue.put((tools, None))
-                        
-                        except Exception as e:
-                            result_queue.put((None, e))
-                    
-                    except Exception as e:
-                        print(f"MCP loop error: {e}")
-    
-    def call_tool(self, name: str, arguments: dict[str, Any] = None) -> str:
-        """Call an MCP tool (thread-safe)."""
+        try:
+            async with stdio_client(server) as (read, write):
+                # Relay server messages so that the server exiting closes the session
+                relay_send, relay_read = anyio.create_memory_object_stream(0)
+                async with anyio.create_task_group() as tasks:
+                    tasks.start_soon(self._relay, read, relay_send)
+                    async with ClientSession(relay_read, write) as session:
+                        await session.initialize()
+                        self._session = session
+                        self._ready.set()
+                        await self._closing.wait()
+                    tasks.cancel_scope.cancel()
+        finally:
+            self._session = None
+            self._ready.set()
+            # Requests still waiting would never get a response from this server
+            for future in list(self._pending):
+                future.cancel()
+    
+    async def _relay(self, source, sink):
+        async with sink:
+            async for message in source:
+                await sink.send(message)
+        # Server stdout closed: the process exited
+        self._closing.set()
+    
+    def _disconnect(self):
+        """Close the session and wait for the MCP server process to be terminated."""
+        with self._lock:
+            connection, self._connection = self._connection, None
+            if connection is None:
+                return
+            for future in list(self._pending):
+                future.cancel()
+            if self._closing is not None:
+                self._loop.call_soon_threadsafe(self._closing.set)
+            try:
+                connection.result(timeout=MCP_STOP_TIMEOUT)
+            except (Exception, concurrent.futures.CancelledError):
+                connection.cancel()
+            self._session = None
+    
+    def _request(self, make_request: Callable[[ClientSession], Awaitable[Any]], description: str, timeout: float | None) -> Any:
+        """Run a session request on the background loop within its deadline."""
         self.start()
+        timeout = MCP_CALL_TIMEOUT if timeout is None else timeout
+        plan_deadline = _deadline.get()
+        if plan_deadline is not None:
+            timeout = min(timeout, plan_deadline - time.monotonic())
+            if timeout <= 0:
+                raise MCPTimeoutError(f"{description}: plan deadline passed")
         
-        result_queue = queue.Queue()
-        self._request_queue.put(("call_tool", {"name": name, "arguments": arguments or {}}, result_queue))
+        session = self._session
+        if session is None:
+            raise MCPConnectionError(f"{description}: Playwright MCP session closed")
         
-        result, error = result_queue.get(timeout=120)
-        if error:
-            raise error
-        return result
+        async def run():
+            async with self._serial:
+                return await make_request(session)
+        
+        future = asyncio.run_coroutine_threadsafe(run(), self._loop)
+        self._pending.add(future)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Cancelling the task only stops waiting; restarting the server stops the work
+            future.cancel()
+            print(f"Warning: {description} timed out after {timeout:.0f}s, restarting the browser session")
+            self._disconnect()
+            raise MCPTimeoutError(
+                f"{description} timed out after {timeout:.0f}s; the browser session was restarted, page state is lost"
+            ) from None
+        except (concurrent.futures.CancelledError, anyio.ClosedResourceError, anyio.BrokenResourceError, McpError) as e:
+            if isinstance(e, McpError) and e.error.code != CONNECTION_CLOSED:
+                raise
+            raise MCPConnectionError(
+                f"{description}: Playwright MCP session closed; it reconnects on the next call, page state is lost"
+            ) from None
+        finally:
+            self._pending.discard(future)
     
-    def list_tools(self) -> list[dict]:
-        """List MCP tools (thread-safe)."""
-        self.start()
+    def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] = None,
+        check: bool = False,
+        raw: bool = False,
+        timeout: float | None = None,
+    ) -> str:
+        """Call an MCP tool (thread-safe).
+        
+        Args:
+            name: MCP tool name
+            arguments: Tool arguments
+            check: Raise MCPToolError if the tool reports an error instead of
+                returning the error text (which is what the LLM should see)
+            raw: Return the full output instead of applying the tool's output
+                policy (for callers that parse it rather than show it to the LLM)
+            timeout: Seconds to wait (default: QA_MCP_CALL_TIMEOUT), capped by
+                any enclosing ``deadline``
+        
+        Raises:
+            MCPTimeoutError: The call missed its deadline
+            MCPConnectionError: The MCP server exited during the call
+        """
+        async def call(session: ClientSession) -> tuple[str, bool]:
+            result = await session.call_tool(name, arguments or {})
+            is_error = bool(getattr(result, "isError", False))
+            if hasattr(result, "content"):
+                texts = [item.text for item in result.content if hasattr(item, "text")]
+                return ("\n".join(texts) if texts else str(result)), is_error
+            return str(result), is_error
         
-        result_queue = queue.Queue()
-        self._request_queue.put(("list_tools", {}, result_queue))
+        text, is_error = self._request(call, name, timeout)
+        emit("tool_call", tool=name, error=is_error)
+        if check and is_error:
+            raise MCPToolError(f"{name} failed: {text}")
+        return text if raw else apply_output_policy(name, text)
+    
+    def list_tools(self) -> list[dict]:
+        """List MCP tools (thread-safe), reconnecting once if the server exited."""
+        async def list_all(session: ClientSession) -> list[dict]:
+            result = await session.list_tools()
+            return [
+                {
+                    "name": t.name,
+                    "description": getattr(t, "description", "") or "",
+                    "inputSchema": getattr(t, "inputSchema", {}) or {},
+                }
+                for t in result.tools
+            ]
         
-        result, error = result_queue.get(timeout=60)
-        if error:
-            raise error
-        return result
+        try:
+            return self._request(list_all, "list_tools", MCP_CONNECT_TIMEOUT)
+        except MCPConnectionError:
+            return self._request(list_all, "list_tools", MCP_CONNECT_TIMEOUT)
     
     def stop(self):
-        """Stop the background thread."""
-        self._running = False
+        """Close the session, terminate the MCP server and stop the background thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._disconnect()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=MCP_STOP_TIMEOUT)
+            if not self._thread.is_alive():
+                self._loop.close()
+            self._thread = self._loop = None
 
 
 # Global background client
 _mcp = MCPBackgroundThread()
 
+BROWSER_POOL_SIZE = int(os.environ.get("QA_BROWSER_POOL_SIZE", "4"))
+
+
+class BrowserPool:
+    """Fixed-size pool of isolated MCP sessions for concurrent browser work.
+    
+    Each pooled client spawns its own Playwright MCP server with an isolated
+    browser profile, so callers holding different clients never share pages,
+    cookies or storage. Clients are started lazily and kept warm between uses.
+    """
+    
+    def __init__(self, size: int = BROWSER_POOL_SIZE, args: list[str] | None = None):
+        self.size = max(1, size)
+        self._args = ["--isolated", *(args or [])]
+        self._idle: queue.Queue[MCPBackgroundThread] = queue.Queue()
+        self._clients: list[MCPBackgroundThread] = []
+        self._lock = threading.Lock()
+    
+    def _new_client(self) -> MCPBackgroundThread:
+        # Called with self._lock held
+        client = MCPBackgroundThread(args=self._args)
+        self._clients.append(client)
+        return client
+    
+    def _checkout(self) -> MCPBackgroundThread:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._clients) < self.size:
+                return self._new_client()
+        return self._idle.get()
+    
+    def warm(self) -> list[MCPBackgroundThread]:
+        """Start all pooled sessions ahead of use and return them."""
+        with self._lock:
+            new = [self._new_client() for _ in range(self.size - len(self._clients))]
+        starters = [threading.Thread(target=client.start) for client in new]
+        for starter in starters:
+            starter.start()
+        for starter in starters:
+            starter.join()
+        for client in new:
+            self._idle.put(client)
+        return new
+    
+    @contextmanager
+    def acquire(self) -> Iterator[MCPBackgroundThread]:
+        """Borrow a client for the duration of the ``with`` block."""
+        client = self._checkout()
+        try:
+            client.start()
+            yield client
+        finally:
+            self._idle.put(client)
+    
+    def close(self):
+        """Stop every pooled session and its MCP server."""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.stop()
+
+
+_pools: dict[tuple[str, ...], BrowserPool] = {}
+_pool_lock = threading.Lock()
+
 
-def _create_langchain_tool(tool_info: dict) -> StructuredTool:
+def get_browser_pool(args: tuple[str, ...] = ()) -> BrowserPool:
+    """Get the shared browser pool, creating it on first use.
+
+    Args:
+        args: Extra Playwright MCP arguments (e.g. ``--browser``, ``--viewport-size``);
+            each distinct set gets a pool of its own
+    """
+    with _pool_lock:
+        if args not in _pools:
+            _pools[args] = BrowserPool(args=list(args))
+        return _pools[args]
+
+
+def shutdown():
+    """Stop the global and pooled MCP sessions so no browser or npx process outlives the run."""
+    _mcp.stop()
+    with _pool_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+    close_traffic_proxy()
+
+
+atexit.register(shutdown)
+
+
+def _create_langchain_tool(tool_info: dict, client: MCPBackgroundThread) -> StructuredTool:
     """Create a LangChain tool."""
     name = tool_info["name"]
     description = tool_info["description"]
@@ -149,7 +384,7 @@ def _create_langchain_tool(tool_info: dict) -> StructuredTool:
     required = schema.get("required", [])
     type_map = {"string": str, "integer": int, "number": float, "boolean": bool, "array": list, "object": dict}
     
-    for prop_name, prop_schema in properties.items():
+    for prop_name, prop_schema in sorted(properties.items()):
         py_type = type_map.get(prop_schema.get("type", "string"), str)
         prop_desc = prop_schema.get("description", "")
         
@@ -161,7 +396,7 @@ def _create_langchain_tool(tool_info: dict) -> StructuredTool:
     def make_sync_fn(tool_name: str):
         def fn(**kwargs) -> str:
             args = {k: v for k, v in kwargs.items() if v is not None}
-            return _mcp.call_tool(tool_name, args)
+            return client.call_tool(tool_name, args)
         return fn
     
     ArgsModel = create_model(f"{name}_args", **fields) if fields else create_model(f"{name}_args")
@@ -192,21 +427,36 @@ def _copy_screenshot_to_workspace(temp_path: str, filename: str) -> str:
     
     if os.path.exists(temp_path):
         shutil.copy2(temp_path, dest_path)
+        saved = _saved_screenshots.get()
+        if saved is not None:
+            saved.append(dest_path.name)
         return str(dest_path)
     
     return f"Screenshot saved (temp): {temp_path}"
 
 
-def save_screenshot(name: str) -> str:
+@contextmanager
+def track_screenshots() -> Iterator[list[str]]:
+    """Collect the file names of screenshots saved inside the block (including by agent tools)."""
+    saved: list[str] = []
+    token = _saved_screenshots.set(saved)
+    try:
+        yield saved
+    finally:
+        _saved_screenshots.reset(token)
+
+
+def save_screenshot(name: str, client: MCPBackgroundThread | None = None) -> str:
     """Take a screenshot and save it to the workspace screenshots folder.
     
     Args:
         name: Descriptive name for the screenshot (e.g., 'login_step1_initial')
+        client: MCP session to capture from (defaults to the global session)
     
     Returns:
         Path to the saved screenshot in the workspace.
     """
-    result = _mcp.call_tool("browser_take_screenshot", {"name": name})
+    result = (client or _mcp).call_tool("browser_take_screenshot", {"name": name}, raw=True)
     
     # Extract temp file path from MCP response (e.g., /tmp/playwright-mcp-output/1234567/screenshot.png)
     match = re.search(r'/tmp/playwright-mcp-output/\d+/[^\s\)\]]+\.png', result)
@@ -219,31 +469,97 @@ def save_screenshot(name: str) -> str:
     return f"Screenshot taken but could not copy to workspace. MCP response: {result}"
 
 
-def _create_save_screenshot_tool() -> StructuredTool:
+def _create_save_screenshot_tool(client: MCPBackgroundThread) -> StructuredTool:
     """Create the custom save_screenshot tool."""
     return StructuredTool(
         name="save_screenshot",
         description="Take a screenshot and save it to qa_workspace/screenshots/ folder. Use descriptive names like 'login_test_step1_initial' or 'form_test_error_state'.",
-        func=save_screenshot,
+        func=lambda name: save_screenshot(name, client),
         args_schema=create_model("save_screenshot_args", name=(str, Field(description="Descriptive name for the screenshot without extension"))),
     )
 
 
-def get_tools() -> list[StructuredTool]:
-    """Get all Playwright MCP tools plus custom screenshot tool."""
-    global _tools_cache
-    if _tools_cache is not None:
-        return _tools_cache
+class BatchAction(BaseModel):
+    """One browser action inside a browser_batch call."""
+    
+    tool: str = Field(description="Browser tool to call, e.g. 'browser_type' or 'browser_click'")
+    arguments: dict[str, Any] = Field(default_factory=dict, description="Arguments for that tool, exactly as it would take them")
+
+
+def run_batch(actions: list[BatchAction], client: MCPBackgroundThread | None = None) -> str:
+    """Run browser actions back-to-back and return one consolidated result.
+    
+    Stops at the first failing action. Only the output of the last action
+    that ran (which carries the current page state) is included in full.
+    
+    Args:
+        actions: Ordered browser actions to execute
+        client: MCP session to run them on (defaults to the global session)
+    
+    Returns:
+        Per-action status lines followed by the final page state.
+    """
+    client = client or _mcp
+    lines = []
+    output = ""
+    for number, action in enumerate(actions, start=1):
+        if not action.tool.startswith("browser_") or action.tool == "browser_batch":
+            lines.append(f"{number}. {action.tool}: FAILED - only browser_* tools can be batched")
+            break
+        try:
+            output = client.call_tool(action.tool, action.arguments, check=True)
+            lines.append(f"{number}. {action.tool}: OK")
+        except Exception as e:
+            lines.append(f"{number}. {action.tool}: FAILED - {e}")
+            break
+    
+    skipped = len(actions) - len(lines)
+    summary = f"Ran {len(lines)} of {len(actions)} actions" + (f" ({skipped} skipped after failure)" if skipped else "")
+    return "\n".join([summary, *lines, "", output]).rstrip()
+
+
+def _create_batch_tool(client: MCPBackgroundThread) -> StructuredTool:
+    """Create the composite browser_batch tool."""
+    return StructuredTool(
+        name="browser_batch",
+        description=(
+            "Run several browser actions back-to-back in one call, e.g. filling every field of a form and "
+            "clicking submit. Takes an ordered list of {tool, arguments} using the regular browser_* tools and "
+            "their arguments (refs must come from the current snapshot). Stops at the first failing action and "
+            "returns a status line per action plus the final page state."
+        ),
+        func=lambda actions: run_batch([BatchAction.model_validate(a) for a in actions], client),
+        args_schema=create_model(
+            "browser_batch_args",
+            actions=(list[BatchAction], Field(description="Ordered browser actions to execute")),
+        ),
+    )
+
+
+def get_tools(client: MCPBackgroundThread | None = None) -> list[StructuredTool]:
+    """Get all Playwright MCP tools plus custom screenshot and batch tools.
+    
+    Args:
+        client: MCP session the tools should drive (defaults to the global session)
+    """
+    client = client or _mcp
+    cached = _tools_cache.get(id(client))
+    if cached is not None:
+        return cached
     
     try:
-        tools_info = _mcp.list_tools()
-        _tools_cache = [_create_langchain_tool(info) for info in tools_info]
-        _tools_cache.append(_create_save_screenshot_tool())
-        print(f"Loaded {len(_tools_cache)} tools (including custom save_screenshot)")
-        return _tools_cache
+        tools_info = client.list_tools()
+        tools = [_create_langchain_tool(info, client) for info in tools_info]
+        tools.append(_create_save_screenshot_tool(client))
+        tools.append(_create_batch_tool(client))
+        # Tool schemas precede the messages in the prompt: keep their order stable for prefix caching
+        tools.sort(key=lambda t: t.name)
+        _tools_cache[id(client)] = tools
+        print(f"Loaded {len(tools)} tools (including custom save_screenshot and browser_batch)")
+        return tools
     except Exception as e:
         print(f"Warning: Could not load Playwright MCP tools: {e}")
-        return [_create_save_screenshot_tool()]
+        return [_create_save_screenshot_tool(client), _create_batch_tool(client)]
 
 
-_tools_cache = None
+_tools_cache: dict[int, list[StructuredTool]] = {}
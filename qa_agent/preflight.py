@@ -0,0 +1,114 @@
+"""Pre-flight smoke check of the target app before any LLM work.
+
+Checks, in order and without the LLM, that the app answers over HTTP, that
+one page load succeeds in a pooled browser, and that the console shows no
+sign the app failed to boot: a failed chunk or module load, or an uncaught
+exception on a page that rendered nothing. The workflow stops
+at the first failed check with an ENVIRONMENT result instead of letting
+agents flail against a dead app.
+"""
+
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+
+from qa_agent.playwright_mcp import get_browser_pool
+
+PREFLIGHT_ENABLED = os.environ.get("QA_PREFLIGHT", "true").lower() not in ("0", "false", "no")
+PREFLIGHT_TIMEOUT = float(os.environ.get("QA_PREFLIGHT_TIMEOUT", "15"))
+
+# Boot failures: fatal whatever the page shows
+FATAL_CONSOLE_RE = re.compile(
+    os.environ.get("QA_PREFLIGHT_FATAL_CONSOLE")
+    or r"ChunkLoadError|Loading (CSS )?chunk .* failed|Failed to fetch dynamically imported module|"
+    r"error loading dynamically imported module|Importing a module script failed|Failed to load module script",
+    re.I,
+)
+# Errors plenty of working apps log: fatal only if the page rendered no content
+_UNCAUGHT_ERROR_RE = re.compile(r"Uncaught|Unhandled|SyntaxError|ReferenceError|TypeError", re.I)
+_CONSOLE_ERROR_RE = re.compile(r"^\s*-?\s*\[error\]\s*(.+)$", re.I | re.M)
+# Snapshot line with a name or text, e.g. '- heading "Home"' or '- paragraph: Welcome'
+_CONTENT_RE = re.compile(r'^\s*- [\w-]+(?: "[^"]+"|[^:\n]*:\s*\S)', re.M)
+
+
+@dataclass
+class PreflightResult:
+    """Outcome of the pre-flight check."""
+
+    url: str
+    ok: bool = True
+    stage: str = ""  # check that failed: "http", "page_load" or "console"
+    details: str = ""
+    http_status: int | None = None
+    console_errors: list[str] = field(default_factory=list)
+    duration: float = 0.0
+
+    def describe(self) -> str:
+        if self.ok:
+            return f"Pre-flight passed for {self.url} in {self.duration:.1f}s"
+        return f"Pre-flight failed at {self.stage} for {self.url}: {self.details}"
+
+
+def check_http(url: str, timeout: float = PREFLIGHT_TIMEOUT) -> tuple[int | None, str]:
+    """Fetch the app URL.
+
+    Returns:
+        (HTTP status or None if unreachable, error description or "")
+    """
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="GET"), timeout=timeout) as response:
+            return response.status, ""
+    except urllib.error.HTTPError as e:
+        return e.code, f"HTTP {e.code} {e.reason}"
+    except (urllib.error.URLError, OSError) as e:
+        return None, f"Unreachable: {getattr(e, 'reason', e)}"
+
+
+def has_content(snapshot: str) -> bool:
+    """Whether a page snapshot shows any named element or text."""
+    _, found, page = snapshot.partition("Page Snapshot")
+    return bool(_CONTENT_RE.search(page if found else snapshot))
+
+
+def fatal_console_errors(console: str, snapshot: str) -> list[str]:
+    """Console errors that mean the app did not start.
+
+    Boot failures (FATAL_CONSOLE_RE) always count; uncaught exceptions only
+    count when the page snapshot shows no content.
+    """
+    blank = not has_content(snapshot)
+    errors = (message.strip() for message in _CONSOLE_ERROR_RE.findall(console))
+    return list(dict.fromkeys(
+        error for error in errors
+        if FATAL_CONSOLE_RE.search(error) or (blank and _UNCAUGHT_ERROR_RE.search(error))
+    ))
+
+
+def run_preflight(url: str, timeout: float = PREFLIGHT_TIMEOUT) -> PreflightResult:
+    """Check that the app is up: HTTP reachability, one page load, no boot failure in the console."""
+    started = time.time()
+    result = PreflightResult(url=url)
+
+    result.http_status, error = check_http(url, timeout)
+    if error or result.http_status >= 400:
+        result.ok, result.stage, result.details = False, "http", error or f"HTTP {result.http_status}"
+    else:
+        try:
+            with get_browser_pool().acquire() as client:
+                client.call_tool("browser_navigate", {"url": url}, check=True, raw=True, timeout=timeout)
+                console = client.call_tool("browser_console_messages", raw=True, timeout=timeout)
+                snapshot = client.call_tool("browser_snapshot", raw=True, timeout=timeout)
+        except Exception as e:
+            result.ok, result.stage, result.details = False, "page_load", str(e)
+        else:
+            result.console_errors = fatal_console_errors(console, snapshot)
+            if result.console_errors:
+                result.ok, result.stage = False, "console"
+                result.details = f"{len(result.console_errors)} fatal console error(s): {result.console_errors[0]}"
+
+    result.duration = time.time() - started
+    print(("✅ " if result.ok else "❌ ") + result.describe())
+    return result
@@ -0,0 +1,207 @@
+"""Per-plan test results and the markdown test report built from them."""
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from qa_agent.usage import RunUsage, Usage
+from qa_agent.workspace import atomic_write_text
+
+# One result line; the last one in a reply is the verdict
+_RESULT_RE = re.compile(
+    r"RESULT:[ \t]*\**[ \t]*(PASS|FAIL)\**(?:[ \t]*[-–:][ \t]*(APP_BUG|TEST_ISSUE|ENVIRONMENT))?[ \t]*:?[ \t]*(.*)$",
+    re.I | re.M,
+)
+
+
+@dataclass
+class PlanResult:
+    """Outcome of executing one test plan."""
+
+    plan: str
+    status: str  # "PASS", "FAIL" or "SKIPPED"
+    duration: float = 0.0
+    category: str = ""  # APP_BUG, TEST_ISSUE or ENVIRONMENT for failures
+    details: str = ""
+    failed_step: int | None = None
+    steps_total: int = 0
+    steps_direct: int = 0
+    screenshots: list[str] = field(default_factory=list)
+    trace: list[str] = field(default_factory=list)  # page URL before each compiled step
+    attempts: int = 1
+    flaky: bool = False
+    usage: dict = field(default_factory=dict)  # LLM usage (see qa_agent.usage.Usage)
+    visual: list[dict] = field(default_factory=list)  # baseline comparisons (see qa_agent.visual.VisualResult)
+    cell: str = ""  # matrix cell (target and browser profile) the plan ran in, "" outside matrix runs
+
+    @property
+    def label(self) -> str:
+        return f"{self.plan} [{self.cell}]" if self.cell else self.plan
+
+    @property
+    def passed(self) -> bool:
+        return self.status == "PASS"
+
+
+def parse_agent_result(text: str) -> tuple[str, str, str]:
+    """Parse the ``RESULT:`` line the runner agent ends its reply with.
+
+    Returns:
+        Tuple of (status, category, details). A reply without a result line
+        counts as a TEST_ISSUE failure.
+    """
+    matches = list(_RESULT_RE.finditer(text or ""))
+    if not matches:
+        return "FAIL", "TEST_ISSUE", "Runner agent did not report a result"
+    status, category, details = matches[-1].groups()
+    status = status.upper()
+    category = (category or ("" if status == "PASS" else "APP_BUG")).upper()
+    return status, category, details.strip()
+
+
+def write_report(
+    results: list[PlanResult],
+    report_path: Path,
+    screenshots_ref: str = "screenshots",
+    usage: RunUsage | None = None,
+    diffs_ref: str = "visual_diffs",
+) -> Path:
+    """Write the markdown test report for a run.
+
+    Args:
+        results: Per-plan results, in execution order
+        report_path: Where to write the report (written atomically)
+        screenshots_ref: Workspace-relative screenshots directory used in references
+        usage: LLM usage of the run, reported per node and prompt source
+        diffs_ref: Workspace-relative visual diff image directory used in references
+    """
+    passed = sum(1 for r in results if r.passed)
+    failed = sum(1 for r in results if r.status == "FAIL")
+    skipped = len(results) - passed - failed
+    visual_changes = sum(1 for r in results for v in r.visual if v["status"] == "changed")
+    cells = list(dict.fromkeys(r.cell for r in results if r.cell))
+
+    lines = [
+        "# Test Execution Report",
+        "",
+        "## Summary",
+        f"- **Total Tests**: {len(results)}",
+        f"- **Passed**: {passed}",
+        f"- **Failed**: {failed}",
+        *([f"- **Skipped**: {skipped} (stopped early)"] if skipped else []),
+        *([f"- **Visual Changes**: {visual_changes}"] if any(r.visual for r in results) else []),
+        f"- **Overall**: {'PASSED' if failed == 0 else 'FAILED'}",
+        f"- **Generated**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+    ]
+
+    if cells:
+        # One column per cell, one row per test
+        statuses = {(r.cell, r.plan): f"{r.status} (flaky)" if r.flaky else r.status for r in results}
+        lines += [
+            "",
+            "## Matrix",
+            "",
+            "| Test | " + " | ".join(cells) + " |",
+            "|------|" + "|".join("-" * (len(cell) + 2) for cell in cells) + "|",
+            *[
+                f"| {plan} | " + " | ".join(statuses.get((cell, plan), "-") for cell in cells) + " |"
+                for plan in dict.fromkeys(r.plan for r in results)
+            ],
+            "| **Passed** | " + " | ".join(
+                f"{sum(1 for r in results if r.cell == cell and r.passed)}/{sum(1 for r in results if r.cell == cell)}"
+                for cell in cells
+            ) + " |",
+        ]
+
+    lines += [
+        "",
+        "## Results",
+        "",
+        "| # | Test | Status | Duration | Category |",
+        "|---|------|--------|----------|----------|",
+    ]
+    for number, r in enumerate(results, start=1):
+        status = f"{r.status} (flaky)" if r.flaky else r.status
+        lines.append(f"| {number} | {r.label} | {status} | {r.duration:.1f}s | {r.category} |")
+
+    lines += ["", "## Details"]
+    for number, r in enumerate(results, start=1):
+        lines += ["", f"### {number}. {r.label}", f"- **Status**: {r.status}", f"- **Duration**: {r.duration:.1f}s"]
+        if r.steps_total:
+            lines.append(f"- **Steps**: {r.steps_total} ({r.steps_direct} executed directly)")
+        if r.usage:
+            lines.append(f"- **LLM Usage**: {Usage(**r.usage).describe()}")
+        if r.attempts > 1 or r.flaky:
+            lines.append(f"- **Attempts**: {r.attempts}" + (" (marked flaky)" if r.flaky else ""))
+        if r.status == "FAIL":
+            step = f" at step {r.failed_step}" if r.failed_step else ""
+            lines.append(f"- **Failure Analysis**: {r.category}{step}: {r.details}")
+        if r.screenshots:
+            lines.append("- **Screenshots**:")
+            lines += [f"  - Screenshot: {screenshots_ref}/{name}" for name in r.screenshots]
+        if r.visual:
+            counts = {status: sum(1 for v in r.visual if v["status"] == status) for status in ("unchanged", "changed", "new")}
+            lines.append(f"- **Visual Check**: {counts['unchanged']} unchanged, {counts['changed']} changed, {counts['new']} new")
+            for v in r.visual:
+                if v["status"] == "changed":
+                    diff = f" (diff: {diffs_ref}/{v['diff_image']})" if v["diff_image"] else ""
+                    lines.append(f"  - Changed: {v['name']}: {v['reason']}{diff}")
+
+    if usage and usage.total.calls:
+        lines += [
+            "",
+            "## LLM Usage",
+            "",
+            f"- **Total**: {usage.total.describe()} in {usage.total.calls} calls "
+            f"({usage.total.input_tokens:,} prompt, {usage.total.cached_tokens:,} cached, {usage.total.output_tokens:,} completion)",
+            "",
+            "| Node | Tokens | Cached Prompt | Latency/Call | Cost |",
+            "|------|--------|---------------|--------------|------|",
+            *[
+                f"| {name} | {u.total_tokens:,} | {u.cache_rate:.0%} | {u.mean_latency:.1f}s | ${u.cost:.2f} |"
+                for name, u in usage.by_node.items()
+            ],
+            "",
+            "| Prompt Source | Prompt Tokens | Cost |",
+            "|---------------|---------------|------|",
+            *[
+                f"| {name} | {u.input_tokens:,} | ${u.cost:.2f} |"
+                for name, u in sorted(usage.by_source.items(), key=lambda item: -item[1].input_tokens)
+            ],
+        ]
+
+    atomic_write_text(report_path, "\n".join(lines) + "\n")
+    return report_path
+
+
+def save_results(results: list[PlanResult], path: Path) -> Path:
+    """Save per-plan results as JSON next to the report, for later stages (e.g. Wrike evidence)."""
+    atomic_write_text(path, json.dumps([asdict(r) for r in results], indent=2))
+    return path
+
+
+def load_results(path: Path) -> list[PlanResult] | None:
+    """Load results saved with ``save_results``, or None if there are none."""
+    if not path.exists():
+        return None
+    return [PlanResult(**data) for data in json.loads(path.read_text())]
+
+
+def summarize_results(results: list[PlanResult], report_path: Path) -> str:
+    """Build the short summary returned as the runner node's message."""
+    if not results:
+        return "No test plans found to run."
+    passed = sum(1 for r in results if r.passed)
+    failed = sum(1 for r in results if r.status == "FAIL")
+    skipped = len(results) - passed - failed
+    lines = [f"Executed {passed + failed} tests: {passed} passed, {failed} failed."]
+    if skipped:
+        lines.append(f"Stopped early: skipped {skipped} remaining tests.")
+    lines += [
+        f"- {r.label}: {r.status}" + (f" ({r.category})" if r.category else "") + (" [flaky]" if r.flaky else "")
+        for r in results
+    ]
+    lines.append(f"Report saved to: {report_path}")
+    return "\n".join(lines)
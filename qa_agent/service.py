@@ -0,0 +1,263 @@
+"""Long-running QA service with a local HTTP API.
+
+Keeps the workflow graph, MCP browser sessions and compiled agents warm
+between jobs, so repeated checks skip the cold start of a fresh process.
+Jobs wrap ``run_planner``, ``run_runner`` and ``run_full``; at most
+``max_concurrent`` run at once and up to ``max_queued`` more wait, beyond
+which submissions are refused. Concurrent jobs run on pooled browser
+sessions only, so they never share pages. Only the most recent
+``MAX_FINISHED_JOBS`` finished jobs are kept.
+
+Endpoints:
+    POST /jobs                 Submit ``{"kind": "plan"|"run"|"full", "params": {...}}``
+    GET  /jobs                 List jobs
+    GET  /jobs/<id>            Job status and result
+    GET  /jobs/<id>/events     Server-sent events with each status change
+    GET  /health               Service status
+"""
+
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+MAX_CONCURRENT = int(os.environ.get("QA_SERVICE_MAX_CONCURRENT", "1"))
+MAX_QUEUED = int(os.environ.get("QA_SERVICE_MAX_QUEUED", "10"))
+MAX_FINISHED_JOBS = int(os.environ.get("QA_SERVICE_MAX_FINISHED", "100"))
+EVENT_KEEPALIVE = 15.0
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the service queue is full."""
+
+
+@dataclass
+class Job:
+    """A submitted workflow run."""
+
+    id: str
+    kind: str
+    params: dict
+    status: str = "queued"  # queued, running, succeeded or failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: str = ""
+    error: str = ""
+    events: list[dict] = field(default_factory=list)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+def _job_functions() -> dict[str, Callable[..., str]]:
+    from qa_agent.orchestrator import run_full, run_planner, run_runner
+    return {"plan": run_planner, "run": run_runner, "full": run_full}
+
+
+class JobManager:
+    """Runs jobs on a fixed number of threads behind a bounded queue."""
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, max_queued: int = MAX_QUEUED):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="qa-job")
+        self._slots = threading.BoundedSemaphore(self.max_concurrent + self.max_queued)
+        self._jobs: dict[str, Job] = {}
+        self._changed = threading.Condition()
+
+    def submit(self, kind: str, params: dict | None = None) -> Job:
+        """Queue a job.
+
+        Raises:
+            ValueError: Unknown job kind or parameters
+            QueueFullError: ``max_concurrent + max_queued`` jobs are already pending
+        """
+        functions = _job_functions()
+        if kind not in functions:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of: {', '.join(functions)}")
+        params = params or {}
+        try:
+            inspect.signature(functions[kind]).bind(**params)
+        except TypeError as e:
+            raise ValueError(f"Invalid parameters for {kind}: {e}") from None
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError(f"Service queue is full ({self.max_queued} waiting)")
+
+        job = Job(id=uuid.uuid4().hex[:12], kind=kind, params=params)
+        with self._changed:
+            self._jobs[job.id] = job
+            self._event(job)
+        self._executor.submit(self._run, job, functions[kind])
+        return job
+
+    def _event(self, job: Job):
+        # Called with self._changed held
+        job.events.append({"status": job.status, "time": time.time()})
+        self._changed.notify_all()
+
+    def _update(self, job: Job, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            self._event(job)
+            if job.finished:
+                self._prune()
+
+    def _prune(self):
+        # Called with self._changed held; jobs are kept in submission order
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _run(self, job: Job, function: Callable[..., str]):
+        self._update(job, status="running", started_at=time.time())
+        params = job.params
+        if self.max_concurrent > 1:
+            # Concurrent jobs on the global browser session would interleave their pages
+            params = {**params, "pooled": True}
+        try:
+            result = function(**params)
+            self._update(job, status="succeeded", result=result, finished_at=time.time())
+        except Exception as e:
+            self._update(job, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            self._slots.release()
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        return sorted(self._jobs.values(), key=lambda job: job.submitted_at)
+
+    def wait_for_events(self, job: Job, seen: int, timeout: float) -> list[dict]:
+        """Block until the job has events after the first ``seen`` ones, or the timeout passes."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(job.events) > seen, timeout=timeout)
+            return job.events[seen:]
+
+    def stats(self) -> dict:
+        running = sum(1 for job in self._jobs.values() if job.status == "running")
+        queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+        return {"running": running, "queued": queued, "max_concurrent": self.max_concurrent, "max_queued": self.max_queued}
+
+
+def warm_up():
+    """Compile the graph and start browser sessions, tools and agents before the first job."""
+    from qa_agent.agents import create_planner_agent, create_runner_agent
+    from qa_agent.playwright_mcp import _mcp, get_browser_pool
+
+    started = time.time()
+    _mcp.start()
+    for client in [None, *get_browser_pool().warm()]:
+        create_planner_agent(client)
+        create_runner_agent(client)
+    print(f"🔥 Warmed up browser sessions and agents in {time.time() - started:.1f}s")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    manager: JobManager
+
+    def _send_json(self, status: HTTPStatus, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _job_json(self, job: Job) -> dict:
+        body = asdict(job)
+        body.pop("events")
+        return body
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if parts == ["health"]:
+            self._send_json(HTTPStatus.OK, {"status": "ok", **self.manager.stats()})
+        elif parts == ["jobs"]:
+            self._send_json(HTTPStatus.OK, [self._job_json(job) for job in self.manager.jobs()])
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.manager.get(parts[1])
+            if job is None:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"No job {parts[1]}"})
+            elif len(parts) == 2:
+                self._send_json(HTTPStatus.OK, self._job_json(job))
+            elif parts[2] == "events":
+                self._stream_events(job)
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            job = self.manager.submit(body.get("kind", ""), body.get("params"))
+        except (ValueError, AttributeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except QueueFullError as e:
+            self._send_json(HTTPStatus.TOO_MANY_REQUESTS, {"error": str(e)})
+        else:
+            self._send_json(HTTPStatus.ACCEPTED, self._job_json(job))
+
+    def _stream_events(self, job: Job):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        seen = 0
+        try:
+            while True:
+                events = self.manager.wait_for_events(job, seen, EVENT_KEEPALIVE)
+                if not events:
+                    self.wfile.write(b": keepalive\n\n")
+                for event in events:
+                    self.wfile.write(f"event: status\ndata: {json.dumps(event)}\n\n".encode())
+                seen += len(events)
+                self.wfile.flush()
+                if job.finished and seen >= len(job.events):
+                    data = json.dumps(self._job_json(job))
+                    self.wfile.write(f"event: result\ndata: {data}\n\n".encode())
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    max_concurrent: int = MAX_CONCURRENT,
+    max_queued: int = MAX_QUEUED,
+    warm: bool = True,
+):
+    """Run the QA service until interrupted.
+
+    With ``max_concurrent`` 1, jobs use the warm global browser session;
+    with more, every job runs on pooled sessions (QA_BROWSER_POOL_SIZE).
+    """
+    from qa_agent.workspace import init_workspace
+
+    init_workspace()
+    if warm:
+        warm_up()
+    handler = type("Handler", (_Handler,), {"manager": JobManager(max_concurrent, max_queued)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"🚀 QA service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,114 @@
+"""Size caps and summaries for MCP tool outputs that go into the LLM context.
+
+Console dumps, network listings and large snapshots can run to tens of KB
+per call. Each tool gets an output policy: known-verbose tools are
+summarized, anything over the byte cap keeps only its head and tail, and
+the full payload is spilled to the workspace where the agent can read it
+on demand.
+"""
+
+import itertools
+import json
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from qa_agent.workspace import agent_path, get_path
+
+DEFAULT_MAX_BYTES = int(os.environ.get("QA_TOOL_OUTPUT_MAX_BYTES", "16000"))
+HEAD_FRACTION = 0.7
+MAX_LISTED_ITEMS = 20
+
+_spill_counter = itertools.count(1)
+
+
+@dataclass
+class OutputPolicy:
+    """How to shrink a tool's output before the LLM sees it."""
+
+    max_bytes: int = DEFAULT_MAX_BYTES
+    summarizer: Callable[[str], str] | None = None
+
+
+def _summarize_console(text: str) -> str:
+    """Count console messages by level and list distinct errors and warnings."""
+    entries = re.findall(r"^\s*-?\s*\[(\w+)\]\s*(.+)$", text, re.M)
+    if not entries:
+        return ""
+    levels = Counter(level.upper() for level, _ in entries)
+    problems = Counter(
+        f"[{level.upper()}] {message.strip()}" for level, message in entries
+        if level.upper() in ("ERROR", "WARNING", "WARN")
+    )
+    lines = ["Console summary: " + ", ".join(f"{count} {level}" for level, count in levels.most_common())]
+    lines += [f"- {msg}" + (f" (x{count})" if count > 1 else "") for msg, count in problems.most_common(MAX_LISTED_ITEMS)]
+    return "\n".join(lines)
+
+
+def _summarize_network(text: str) -> str:
+    """Count requests by status class and list the failed ones."""
+    entries = re.findall(r"^\s*-?\s*\[(\w+)\]\s*(\S+)(?:\s*=>\s*\[(\w+)\])?", text, re.M)
+    if not entries:
+        return ""
+    classes = Counter((status[0] + "xx") if status.isdigit() else "no response" for _, _, status in entries)
+    failed = [
+        f"- [{method}] {url} => {status or 'no response'}" for method, url, status in entries
+        if not status.isdigit() or int(status) >= 400
+    ]
+    lines = [f"Network summary: {len(entries)} requests (" + ", ".join(f"{n} {c}" for c, n in sorted(classes.items())) + ")"]
+    lines += failed[:MAX_LISTED_ITEMS]
+    if len(failed) > MAX_LISTED_ITEMS:
+        lines.append(f"- ... {len(failed) - MAX_LISTED_ITEMS} more failed requests")
+    return "\n".join(lines)
+
+
+TOOL_OUTPUT_POLICIES: dict[str, OutputPolicy] = {
+    "browser_console_messages": OutputPolicy(max_bytes=4000, summarizer=_summarize_console),
+    "browser_network_requests": OutputPolicy(max_bytes=4000, summarizer=_summarize_network),
+    "browser_snapshot": OutputPolicy(max_bytes=24000),
+}
+
+# Per-tool byte caps from the environment, e.g. QA_TOOL_OUTPUT_LIMITS='{"browser_snapshot": 40000}'
+for _tool, _max_bytes in json.loads(os.environ.get("QA_TOOL_OUTPUT_LIMITS", "{}")).items():
+    TOOL_OUTPUT_POLICIES.setdefault(_tool, OutputPolicy()).max_bytes = int(_max_bytes)
+
+
+def get_output_policy(tool_name: str) -> OutputPolicy:
+    """Get the output policy for a tool (the default cap if it has none)."""
+    return TOOL_OUTPUT_POLICIES.get(tool_name) or OutputPolicy()
+
+
+def _truncate(text: str, max_bytes: int) -> str:
+    """Keep the head and tail of ``text`` within roughly ``max_bytes``, cutting at line breaks."""
+    head_budget = int(max_bytes * HEAD_FRACTION)
+    tail_budget = max_bytes - head_budget
+    head = text[:head_budget].rsplit("\n", 1)[0]
+    tail = text[-tail_budget:].split("\n", 1)[-1]
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n\n[... {omitted} characters omitted ...]\n\n{tail}"
+
+
+def _spill(tool_name: str, text: str) -> Path:
+    """Save a full tool payload to the workspace and return its path."""
+    spill_dir = get_path("tool_outputs")
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    path = spill_dir / f"{tool_name}_{time.strftime('%Y%m%d_%H%M%S')}_{next(_spill_counter)}.txt"
+    path.write_text(text)
+    return path
+
+
+def apply_output_policy(tool_name: str, text: str) -> str:
+    """Shrink a tool output according to its policy, spilling the full payload if anything is cut."""
+    policy = get_output_policy(tool_name)
+    size = len(text.encode("utf-8", errors="replace"))
+    summary = policy.summarizer(text) if policy.summarizer and size > policy.max_bytes else ""
+    if not summary and size <= policy.max_bytes:
+        return text
+
+    shortened = summary if summary and len(summary) <= policy.max_bytes else _truncate(summary or text, policy.max_bytes)
+    path = _spill(tool_name, text)
+    return f"{shortened}\n\n[Full output ({size} bytes) saved to {agent_path(path)}, use read_file to see it]"
@@ -0,0 +1,313 @@
+"""Record and replay of the target app's backend traffic.
+
+With QA_TRAFFIC_MODE set, every Playwright MCP browser is launched behind
+a local HTTP proxy. In ``record`` mode the proxy passes all requests
+through and stores the backend responses (API calls, not the HTML, JS,
+CSS, images or fonts of the app itself) in a HAR file. In ``replay`` mode
+it serves those stored responses locally and passes everything else
+through, so the app bundle still comes from TEST_APP_URL while its API
+calls no longer depend on backend speed or state.
+
+HTTPS requests are tunnelled through unchanged (recording them would need
+a man-in-the-middle certificate), so only plain-HTTP backends, such as a
+local dev API or a dev server proxying ``/api``, are recorded.
+"""
+
+import base64
+import hashlib
+import http.client
+import json
+import os
+import re
+import select
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import UTC, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from qa_agent.workspace import atomic_write_text, get_path
+
+TRAFFIC_MODE = os.environ.get("QA_TRAFFIC_MODE", "").lower()  # "record", "replay" or "" (off)
+TRAFFIC_STORE = os.environ.get("QA_TRAFFIC_STORE", "")
+URL_FILTER = os.environ.get("QA_TRAFFIC_URL_FILTER", "")
+UPSTREAM_TIMEOUT = 30.0
+
+# Responses of these types belong to the app itself, not its backend
+STATIC_TYPES_RE = re.compile(r"^(text/html|text/css|image/|font/|audio/|video/|application/(x-)?(javascript|font|wasm))|javascript")
+STATIC_PATH_RE = re.compile(r"\.(m?js|css|map|html?|png|jpe?g|gif|svg|ico|webp|woff2?|ttf|otf|wasm)$", re.I)
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-connection", "proxy-authorization", "proxy-authenticate",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade", "content-length",
+}
+SECRET_HEADERS = {"cookie", "authorization"}  # not written to the recording
+# Not forwarded while recording, so revalidated calls are stored as full
+# responses rather than bodiless 304s any replaying browser could be served
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since", "if-match", "if-unmodified-since", "if-range"}
+
+
+def default_store() -> Path:
+    return Path(TRAFFIC_STORE) if TRAFFIC_STORE else get_path("traffic") / "traffic.har"
+
+
+def is_backend(method: str, url: str, content_type: str) -> bool:
+    """Whether a request/response belongs to the app's backend rather than its bundle."""
+    if URL_FILTER:
+        return re.search(URL_FILTER, url) is not None
+    if method != "GET":
+        return True
+    if STATIC_PATH_RE.search(urlsplit(url).path):
+        return False
+    return not STATIC_TYPES_RE.search(content_type.split(";")[0].strip().lower())
+
+
+def _request_key(method: str, url: str, body: bytes) -> str:
+    digest = hashlib.sha1(body).hexdigest()[:12] if body else ""
+    return f"{method} {url} {digest}".rstrip()
+
+
+def _headers(pairs) -> list[dict]:
+    return [{"name": name, "value": value} for name, value in pairs if name.lower() not in HOP_BY_HOP]
+
+
+def _content(body: bytes, mime_type: str) -> dict:
+    content = {"size": len(body), "mimeType": mime_type}
+    try:
+        content["text"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        content["text"], content["encoding"] = base64.b64encode(body).decode("ascii"), "base64"
+    return content
+
+
+def _body(content: dict) -> bytes:
+    text = content.get("text", "")
+    return base64.b64decode(text) if content.get("encoding") == "base64" else text.encode("utf-8")
+
+
+class TrafficProxy:
+    """Local HTTP proxy that records backend responses to, or replays them from, a HAR file."""
+
+    def __init__(self, mode: str, store: Path | None = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown traffic mode {mode!r}, expected 'record' or 'replay'")
+        self.mode = mode
+        self.store = store or default_store()
+        self.stats: Counter[str] = Counter()
+        self._entries: list[dict] = []
+        self._recorded: dict[str, list[dict]] = {}
+        self._served: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+        if mode == "replay":
+            if not self.store.exists():
+                raise FileNotFoundError(f"No recorded traffic at {self.store}, run with QA_TRAFFIC_MODE=record first")
+            for entry in json.loads(self.store.read_text())["log"]["entries"]:
+                if entry["response"]["status"] == 304:
+                    continue  # recorded by older versions; only full responses are replayed
+                request = entry["request"]
+                key = _request_key(request["method"], request["url"], _body(request.get("postData", {})))
+                self._recorded.setdefault(key, []).append(entry)
+            print(f"🎞️  Replaying {sum(map(len, self._recorded.values()))} recorded backend responses from {self.store}")
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "TrafficProxy":
+        handler = type("Handler", (_ProxyHandler,), {"proxy": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="traffic-proxy").start()
+        return self
+
+    def stop(self):
+        """Stop the proxy; in record mode, write the HAR file."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.mode == "record":
+            self.save()
+        summary = ", ".join(f"{count} {name}" for name, count in sorted(self.stats.items()))
+        print(f"🎞️  Traffic {self.mode}: {summary or 'no requests'}")
+
+    def save(self):
+        with self._lock:
+            har = {"log": {"version": "1.2", "creator": {"name": "qa_agent", "version": "1"}, "entries": list(self._entries)}}
+        atomic_write_text(self.store, json.dumps(har, indent=1))
+
+    def replay(self, method: str, url: str, body: bytes) -> dict | None:
+        """Return the recorded response for a request, in recording order (repeating the last one)."""
+        key = _request_key(method, url, body)
+        with self._lock:
+            entries = self._recorded.get(key)
+            if not entries:
+                return None
+            entry = entries[min(self._served[key], len(entries) - 1)]
+            self._served[key] += 1
+            self.stats["replayed"] += 1
+        return entry["response"]
+
+    def record(self, method: str, url: str, request_headers, body: bytes, response: http.client.HTTPResponse, response_body: bytes, elapsed: float):
+        mime_type = response.getheader("Content-Type", "")
+        if response.status == 304 or not is_backend(method, url, mime_type):
+            with self._lock:
+                self.stats["passed through"] += 1
+            return
+        if self.mode == "replay":
+            # Backend call missing from the recording: it went to the live backend
+            with self._lock:
+                self.stats["live (not recorded)"] += 1
+            print(f"Warning: No recorded response for {method} {url}, used the live backend")
+            return
+        request = {
+            "method": method,
+            "url": url,
+            "httpVersion": "HTTP/1.1",
+            "headers": _headers((k, v) for k, v in request_headers.items() if k.lower() not in SECRET_HEADERS),
+            "queryString": [],
+            "headersSize": -1,
+            "bodySize": len(body),
+        }
+        if body:
+            request["postData"] = _content(body, request_headers.get("Content-Type", ""))
+        entry = {
+            "startedDateTime": datetime.now(UTC).isoformat(),
+            "time": round(elapsed * 1000, 1),
+            "request": request,
+            "response": {
+                "status": response.status,
+                "statusText": response.reason,
+                "httpVersion": "HTTP/1.1",
+                "headers": _headers(response.getheaders()),
+                "content": _content(response_body, mime_type),
+                "redirectURL": response.getheader("Location", ""),
+                "headersSize": -1,
+                "bodySize": len(response_body),
+            },
+            "cache": {},
+            "timings": {"send": 0, "wait": round(elapsed * 1000, 1), "receive": 0},
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.stats["recorded"] += 1
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    proxy: TrafficProxy
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, reason: str, headers: list[tuple[str, str]], body: bytes):
+        self.send_response(status, reason)
+        for name, value in headers:
+            if name.lower() not in HOP_BY_HOP:
+                self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _handle(self):
+        url = self.path
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        recorded = self.proxy.replay(self.command, url, body) if self.proxy.mode == "replay" else None
+        if recorded is not None:
+            headers = [(h["name"], h["value"]) for h in recorded["headers"]] + [("X-QA-Replayed", "1")]
+            self._send(recorded["status"], recorded.get("statusText", ""), headers, _body(recorded["content"]))
+            return
+
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            self._send(400, "Bad Request", [], b"Proxy requests need an absolute http:// URL")
+            return
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        skipped = HOP_BY_HOP | (CONDITIONAL_HEADERS if self.proxy.mode == "record" else set())
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in skipped}
+        headers["Accept-Encoding"] = "identity"  # store and serve plain bodies
+
+        started = time.monotonic()
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=UPSTREAM_TIMEOUT)
+        try:
+            connection.request(self.command, path, body=body or None, headers=headers)
+            response = connection.getresponse()
+            response_body = response.read()
+        except OSError as e:
+            self._send(502, "Bad Gateway", [], f"Upstream request failed: {e}".encode())
+            return
+        finally:
+            connection.close()
+        self.proxy.record(self.command, url, self.headers, body, response, response_body, time.monotonic() - started)
+        self._send(response.status, response.reason, response.getheaders(), response_body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = _handle
+
+    def do_CONNECT(self):
+        """Tunnel HTTPS and WebSocket connections through unchanged."""
+        host, _, port = self.path.rpartition(":")
+        try:
+            upstream = socket.create_connection((host, int(port)), timeout=UPSTREAM_TIMEOUT)
+        except OSError as e:
+            self._send(502, "Bad Gateway", [], f"Tunnel failed: {e}".encode())
+            return
+        self.send_response(200, "Connection Established")
+        self.end_headers()
+        with self.proxy._lock:
+            self.proxy.stats["tunnelled"] += 1
+        client = self.connection
+        try:
+            while True:
+                readable, _, _ = select.select([client, upstream], [], [], UPSTREAM_TIMEOUT * 10)
+                if not readable:
+                    break
+                for source in readable:
+                    data = source.recv(65536)
+                    if not data:
+                        return
+                    (upstream if source is client else client).sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+            self.close_connection = True
+
+
+_proxy: TrafficProxy | None = None
+_proxy_lock = threading.Lock()
+
+
+def get_traffic_proxy() -> TrafficProxy | None:
+    """Get the shared record/replay proxy, started on first use; None unless QA_TRAFFIC_MODE is set."""
+    global _proxy
+    if not TRAFFIC_MODE:
+        return None
+    with _proxy_lock:
+        if _proxy is None:
+            _proxy = TrafficProxy(TRAFFIC_MODE).start()
+            print(f"🎞️  Traffic {TRAFFIC_MODE} proxy on {_proxy.url} ({_proxy.store})")
+        return _proxy
+
+
+def browser_args() -> list[str]:
+    """Playwright MCP arguments that route the browser through the proxy, if enabled."""
+    proxy = get_traffic_proxy()
+    return ["--proxy-server", proxy.url] if proxy else []
+
+
+def close_traffic_proxy():
+    """Stop the proxy and write the recording (called once browsers are closed)."""
+    global _proxy
+    with _proxy_lock:
+        if _proxy is not None:
+            _proxy.stop()
+            _proxy = None
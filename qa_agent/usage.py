@@ -0,0 +1,278 @@
+"""Token and cost accounting for LLM calls, with per-run budgets.
+
+Every ChatOpenAI call made by the agents reports its usage to
+``USAGE_CALLBACK``, which attributes it to the current run, workflow node
+and test plan (tracked in context variables), and splits the prompt
+tokens across the sources that filled the prompt: the system prompt, the
+conversation and each tool's results. ``BudgetMiddleware`` asks an agent
+to wrap up once a budget is used up, and ends it if it keeps going.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+from uuid import UUID
+
+from langchain.agents.middleware import AgentMiddleware, hook_config
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import LLMResult
+
+from qa_agent.workspace import get_run_id
+
+# USD per million tokens: (input, cached input, output)
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+MODEL_PRICES = {**DEFAULT_PRICES, **json.loads(os.environ.get("QA_MODEL_PRICES") or "{}")}
+
+# Budgets, 0 means unlimited
+RUN_TOKEN_BUDGET = int(os.environ.get("QA_RUN_TOKEN_BUDGET", "0"))
+RUN_COST_BUDGET = float(os.environ.get("QA_RUN_COST_BUDGET", "0"))
+PLAN_TOKEN_BUDGET = int(os.environ.get("QA_PLAN_TOKEN_BUDGET", "0"))
+MAX_TRACKED_RUNS = 64  # runs whose usage stays in memory (long-lived service and workers)
+
+WRAP_UP_NOTICE = "budget_notice"
+
+_node: ContextVar[str] = ContextVar("usage_node", default="")
+_plan: ContextVar[str] = ContextVar("usage_plan", default="")
+
+
+@dataclass
+class Usage:
+    """Token counts and cost of a set of LLM calls."""
+
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    calls: int = 0
+    latency: float = 0.0  # seconds spent waiting for the model, summed over calls
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def cache_rate(self) -> float:
+        """Share of prompt tokens served from the provider's prompt cache."""
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.latency / self.calls if self.calls else 0.0
+
+    def add(self, other: "Usage"):
+        self.input_tokens += other.input_tokens
+        self.cached_tokens += other.cached_tokens
+        self.output_tokens += other.output_tokens
+        self.cost += other.cost
+        self.calls += other.calls
+        self.latency += other.latency
+
+    def describe(self) -> str:
+        return f"{self.total_tokens:,} tokens (${self.cost:.2f})"
+
+
+@dataclass
+class RunUsage:
+    """LLM usage of one run, broken down by node, plan and prompt source."""
+
+    total: Usage = field(default_factory=Usage)
+    by_node: dict[str, Usage] = field(default_factory=dict)
+    by_plan: dict[str, Usage] = field(default_factory=dict)
+    by_source: dict[str, Usage] = field(default_factory=dict)  # prompt tokens only
+
+    def record(
+        self,
+        usage: Usage,
+        node: str = "",
+        plan: str = "",
+        sources: dict[str, float] | None = None,
+        input_cost: float = 0.0,
+    ):
+        """Add one call's usage; ``sources`` splits its prompt (and ``input_cost``) by fraction."""
+        with _lock:
+            self.total.add(usage)
+            self.by_node.setdefault(node or "other", Usage()).add(usage)
+            if plan:
+                self.by_plan.setdefault(plan, Usage()).add(usage)
+            for source, share in (sources or {}).items():
+                part = Usage(
+                    input_tokens=round(usage.input_tokens * share),
+                    cost=input_cost * share,
+                )
+                self.by_source.setdefault(source, Usage()).add(part)
+
+    def plan_usage(self, plan: str) -> Usage:
+        return self.by_plan.get(plan, Usage())
+
+    def to_dict(self) -> dict:
+        return {
+            "total": asdict(self.total),
+            "by_node": {name: asdict(u) for name, u in self.by_node.items()},
+            "by_plan": {name: asdict(u) for name, u in self.by_plan.items()},
+            "by_source": {name: asdict(u) for name, u in self.by_source.items()},
+        }
+
+    def summary(self) -> str:
+        """Short usage summary for the final workflow message."""
+        if not self.total.calls:
+            return ""
+        nodes = ", ".join(f"{name} {u.total_tokens:,}" for name, u in self.by_node.items())
+        top_sources = sorted(self.by_source.items(), key=lambda item: -item[1].input_tokens)[:3]
+        sources = ", ".join(f"{name} {u.input_tokens:,}" for name, u in top_sources)
+        lines = [
+            f"LLM usage: {self.total.describe()} in {self.total.calls} calls ({nodes})",
+            f"Prompt cache: {self.total.cache_rate:.0%} of prompt tokens cached, {self.total.mean_latency:.1f}s per call",
+        ]
+        if sources:
+            lines.append(f"Largest prompt sources: {sources}")
+        return "\n".join(lines)
+
+
+_runs: OrderedDict[str, RunUsage] = OrderedDict()
+_lock = threading.RLock()
+
+
+def get_run_usage(run_id: str | None = None) -> RunUsage:
+    """Usage of a run, the current one by default.
+
+    Only the MAX_TRACKED_RUNS most recently used runs are kept; a finished
+    run's usage lives on in its ``usage.json``.
+    """
+    run_id = run_id or get_run_id() or ""
+    with _lock:
+        if run_id not in _runs:
+            _runs[run_id] = RunUsage()
+            while len(_runs) > MAX_TRACKED_RUNS:
+                _runs.popitem(last=False)
+        _runs.move_to_end(run_id)
+        return _runs[run_id]
+
+
+@contextmanager
+def usage_scope(node: str | None = None, plan: str | None = None) -> Iterator[None]:
+    """Attribute LLM calls made inside the block to a workflow node and/or plan."""
+    tokens = [(var, var.set(value)) for var, value in ((_node, node), (_plan, plan)) if value is not None]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def _price(model: str) -> tuple[float, float, float]:
+    # Longest matching prefix, so dated snapshots and "-mini" variants resolve correctly
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else (0.0, 0.0, 0.0)
+
+
+def _source_shares(messages: list[BaseMessage]) -> dict[str, float]:
+    """Split a prompt by where its content came from, as fractions of its size."""
+    sizes: dict[str, int] = {}
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            source = f"tool:{message.name or 'unknown'}"
+        elif isinstance(message, SystemMessage):
+            source = "system_prompt"
+        else:
+            source = "conversation"
+        sizes[source] = sizes.get(source, 0) + len(str(message.content))
+    total = sum(sizes.values()) or 1
+    return {source: size / total for source, size in sizes.items()}
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Records the token usage of each chat model call."""
+
+    def __init__(self):
+        self._pending: dict[UUID, tuple[str, str, str, dict[str, float], float]] = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list[list[BaseMessage]], *, run_id: UUID, **kwargs: Any):
+        # Capture the attribution here: this runs in the caller's context
+        self._pending[run_id] = (get_run_id() or "", _node.get(), _plan.get(), _source_shares(messages[0]), time.monotonic())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        pending = self._pending.pop(run_id, None)
+        if pending is None or not response.generations or not response.generations[0]:
+            return
+        message = getattr(response.generations[0][0], "message", None)
+        metadata = getattr(message, "usage_metadata", None)
+        if not metadata:
+            return
+        model = (response.llm_output or {}).get("model_name") or getattr(message, "response_metadata", {}).get("model_name", "")
+        input_price, cached_price, output_price = _price(model)
+        cached = (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+        input_cost = ((metadata["input_tokens"] - cached) * input_price + cached * cached_price) / 1_000_000
+        usage = Usage(
+            input_tokens=metadata["input_tokens"],
+            cached_tokens=cached,
+            output_tokens=metadata["output_tokens"],
+            cost=input_cost + metadata["output_tokens"] * output_price / 1_000_000,
+            calls=1,
+            latency=time.monotonic() - pending[4],
+        )
+        workflow_run, node, plan, sources, _ = pending
+        get_run_usage(workflow_run).record(usage, node, plan, sources, input_cost)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._pending.pop(run_id, None)
+
+
+USAGE_CALLBACK = UsageCallback()
+
+
+def run_budget_exceeded(run_id: str | None = None) -> str:
+    """Describe the exceeded run budget, or return "" if within budget."""
+    total = get_run_usage(run_id).total
+    if RUN_TOKEN_BUDGET and total.total_tokens >= RUN_TOKEN_BUDGET:
+        return f"Run token budget of {RUN_TOKEN_BUDGET:,} exceeded"
+    if RUN_COST_BUDGET and total.cost >= RUN_COST_BUDGET:
+        return f"Run cost budget of ${RUN_COST_BUDGET:.2f} exceeded"
+    return ""
+
+
+def budget_exceeded(plan: str | None = None) -> str:
+    """Describe the exceeded run or plan budget, or return "" if within budget."""
+    plan = _plan.get() if plan is None else plan
+    reason = run_budget_exceeded()
+    if not reason and plan and PLAN_TOKEN_BUDGET:
+        if get_run_usage().plan_usage(plan).total_tokens >= PLAN_TOKEN_BUDGET:
+            reason = f"Plan token budget of {PLAN_TOKEN_BUDGET:,} exceeded"
+    return reason
+
+
+class BudgetMiddleware(AgentMiddleware):
+    """Make the agent wrap up when a budget is used up.
+
+    The first model call over budget gets a notice asking for a final
+    answer; if the agent is still going after that, it is ended with a
+    failed RESULT line (the runner reports such a plan as SKIPPED).
+    """
+
+    @hook_config(can_jump_to=["end"])
+    def before_model(self, state: dict, runtime) -> dict[str, Any] | None:
+        reason = budget_exceeded()
+        if not reason:
+            return None
+        if any(getattr(m, "name", None) == WRAP_UP_NOTICE for m in state["messages"]):
+            return {"jump_to": "end", "messages": [AIMessage(content=f"RESULT: FAIL - TEST_ISSUE: {reason}")]}
+        notice = (
+            f"{reason}. Stop exploring now: finish with what you have, save any work in progress, "
+            "and end with your final answer (runner: your RESULT line)."
+        )
+        return {"messages": [HumanMessage(content=notice, name=WRAP_UP_NOTICE)]}
@@ -0,0 +1,194 @@
+"""Visual regression checks of run screenshots against stored baselines.
+
+Screenshots follow the ``<test>_step<N>_<desc>`` naming convention, so each
+one is matched by file name to a baseline in ``qa_workspace/baselines/``
+(in a subdirectory per cell for matrix runs, as viewports and browsers
+render differently).
+A perceptual hash and a pixel diff confirm unchanged screens cheaply
+(without a model call); everything else gets a windowed SSIM score, and
+regressions get a diff image with the changed pixels in red. Comparisons
+run in batch on a thread pool (NumPy releases the GIL).
+
+Requires the optional ``numpy`` and ``pillow`` packages; without them the
+check is skipped.
+"""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+
+from qa_agent.results import PlanResult
+from qa_agent.workspace import get_path
+
+SSIM_THRESHOLD = float(os.environ.get("QA_VISUAL_SSIM_THRESHOLD", "0.98"))
+PIXEL_THRESHOLD = float(os.environ.get("QA_VISUAL_PIXEL_THRESHOLD", "0.001"))
+FAIL_ON_CHANGE = os.environ.get("QA_VISUAL_FAIL_ON_CHANGE", "").lower() in ("1", "true", "yes")
+VISUAL_WORKERS = int(os.environ.get("QA_VISUAL_WORKERS", str(os.cpu_count() or 4)))
+
+PIXEL_TOLERANCE = 16  # grey levels a pixel may move (anti-aliasing, compression) before it counts as changed
+SSIM_WINDOW = 8
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+_missing_deps_warned = False
+
+
+@dataclass
+class VisualResult:
+    """Comparison of one screenshot with its baseline."""
+
+    name: str
+    status: str  # "unchanged", "changed" or "new" (no baseline yet)
+    hash_distance: int = 0
+    pixel_ratio: float = 0.0  # share of pixels that moved more than PIXEL_TOLERANCE
+    ssim: float = 1.0
+    diff_image: str = ""
+    reason: str = ""
+
+
+def _load(path: Path) -> "np.ndarray":
+    with Image.open(path) as image:
+        return np.asarray(image.convert("L"), dtype=np.float64)
+
+
+def perceptual_hash(gray: "np.ndarray") -> "np.ndarray":
+    """64-bit difference hash: brightness gradients of a 9x8 thumbnail."""
+    thumb = np.asarray(Image.fromarray(gray.astype(np.uint8)).resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    return (thumb[:, 1:] > thumb[:, :-1]).ravel()
+
+
+def _box_mean(image: "np.ndarray", size: int) -> "np.ndarray":
+    """Mean over every ``size`` x ``size`` window, via an integral image."""
+    integral = np.pad(image, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    sums = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+    return sums / (size * size)
+
+
+def ssim(a: "np.ndarray", b: "np.ndarray", window: int = SSIM_WINDOW) -> float:
+    """Mean structural similarity of two greyscale images over sliding windows."""
+    window = min(window, *a.shape)  # tiny images: one window over the whole image
+    mu_a, mu_b = _box_mean(a, window), _box_mean(b, window)
+    var_a = _box_mean(a * a, window) - mu_a ** 2
+    var_b = _box_mean(b * b, window) - mu_b ** 2
+    covar = _box_mean(a * b, window) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + _C1) * (2 * covar + _C2)) / ((mu_a ** 2 + mu_b ** 2 + _C1) * (var_a + var_b + _C2))
+    return float(ssim_map.mean())
+
+
+def _write_diff(baseline: "np.ndarray", changed: "np.ndarray", path: Path):
+    """Dimmed baseline with the changed pixels in red."""
+    rgb = np.repeat((baseline * 0.4)[:, :, None], 3, axis=2).astype(np.uint8)
+    rgb[changed] = (255, 0, 0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.fromarray(rgb).save(path)
+
+
+def compare_screenshot(screenshot: Path, baseline: Path, diff_dir: Path, name: str = "") -> VisualResult:
+    """Compare one screenshot with its baseline.
+
+    ``name`` is the screenshot's path relative to the run's screenshots
+    directory (default: its file name); the diff image is written under it.
+    """
+    name = name or screenshot.name
+    if not baseline.exists():
+        return VisualResult(name=name, status="new")
+
+    current, reference = _load(screenshot), _load(baseline)
+    if current.shape != reference.shape:
+        return VisualResult(
+            name=name,
+            status="changed",
+            reason=f"Size changed from {reference.shape[1]}x{reference.shape[0]} to {current.shape[1]}x{current.shape[0]}",
+        )
+
+    hash_distance = int(np.count_nonzero(perceptual_hash(current) != perceptual_hash(reference)))
+    changed = np.abs(current - reference) > PIXEL_TOLERANCE
+    pixel_ratio = float(changed.mean())
+    if hash_distance == 0 and pixel_ratio <= PIXEL_THRESHOLD:
+        return VisualResult(name=name, status="unchanged", pixel_ratio=pixel_ratio)
+
+    score = ssim(current, reference)
+    result = VisualResult(name=name, status="unchanged", hash_distance=hash_distance, pixel_ratio=pixel_ratio, ssim=score)
+    # SSIM decides: moved pixels alone (anti-aliasing, a blinking caret) are no regression
+    if score < SSIM_THRESHOLD:
+        result.status = "changed"
+        result.reason = f"SSIM {score:.3f}, {pixel_ratio:.2%} of pixels changed"
+        _write_diff(reference, changed, diff_dir / name)
+        result.diff_image = name
+    return result
+
+
+def check_visual_regressions(results: list[PlanResult]) -> list[VisualResult]:
+    """Compare the screenshots of plan results with their baselines.
+
+    The runner calls this for each plan as it finishes, before its outcome
+    is recorded or streamed. Each plan's comparisons are stored on its result
+    (``visual``). Screenshots of passing plans without a baseline become the
+    baseline. With QA_VISUAL_FAIL_ON_CHANGE, a passing plan with a changed
+    screen fails as an APP_BUG.
+    """
+    global _missing_deps_warned
+    if np is None:
+        if not _missing_deps_warned:
+            print("Warning: Visual regression check needs numpy and pillow (uv sync --extra visual), skipping")
+            _missing_deps_warned = True
+        return []
+
+    screenshots_dir, baselines_dir, diff_dir = get_path("screenshots"), get_path("baselines"), get_path("visual_diffs")
+    jobs = [(r, name) for r in results for name in r.screenshots if (screenshots_dir / name).exists()]
+    if not jobs:
+        return []
+
+    def compare(job: tuple[PlanResult, str]) -> VisualResult:
+        name = job[1]
+        try:
+            return compare_screenshot(screenshots_dir / name, baselines_dir / name, diff_dir, name)
+        except Exception as e:
+            return VisualResult(name=name, status="changed", reason=f"Could not compare: {e}")
+
+    with ThreadPoolExecutor(max_workers=max(1, VISUAL_WORKERS)) as executor:
+        visuals = list(executor.map(compare, jobs))
+
+    for (result, name), visual in zip(jobs, visuals):
+        result.visual.append(asdict(visual))
+        if visual.status == "changed" and FAIL_ON_CHANGE and result.passed:
+            result.status, result.category = "FAIL", "APP_BUG"
+            result.details = f"Visual regression in {name}: {visual.reason}"
+    # Only once every verdict is in: a plan failed by one screen sets no baselines
+    for (result, name), visual in zip(jobs, visuals):
+        if visual.status == "new" and result.passed:
+            (baselines_dir / name).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(screenshots_dir / name, baselines_dir / name)
+
+    changed = sum(1 for v in visuals if v.status == "changed")
+    unchanged = sum(1 for v in visuals if v.status == "unchanged")
+    print(f"🖼️  Visual check: {unchanged} unchanged, {changed} changed, {len(visuals) - changed - unchanged} new")
+    return visuals
+
+
+def accept_baselines(run_dir: Path, names: list[str] | None = None) -> list[str]:
+    """Make a run's screenshots the new baselines.
+
+    Args:
+        run_dir: The run's directory (``runs/<run_id>/``)
+        names: Screenshot names to accept, relative to the run's screenshots
+            directory (default: all of the run's screenshots)
+    """
+    baselines_dir = get_path("baselines")
+    screenshots_dir = run_dir / "screenshots"
+    accepted = []
+    for screenshot in sorted(screenshots_dir.rglob("*.png")):
+        name = screenshot.relative_to(screenshots_dir).as_posix()
+        if names is None or name in names:
+            (baselines_dir / name).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(screenshot, baselines_dir / name)
+            accepted.append(name)
+    return accepted
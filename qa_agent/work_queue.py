@@ -0,0 +1,241 @@
+"""Pluggable work queue for distributing plan execution across workers.
+
+The coordinator node enqueues one job per plan and collects per-plan
+results; ``python -m qa_agent worker`` processes pull jobs, run them with
+their own MCP session and runner agent, and push results back. A SQLite
+file works as a broker for workers on one host (or a shared volume); a
+local Redis serves workers spread across CI nodes.
+
+Claimed jobs are leased: a worker renews its lease while it runs a job,
+and a job whose lease expires (its worker died) goes back on the queue.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+
+from qa_agent.workspace import WORKSPACE_ROOT
+
+QUEUE_URL = os.environ.get("QA_QUEUE_URL", f"sqlite:///{WORKSPACE_ROOT / 'queue.db'}")
+JOB_LEASE = float(os.environ.get("QA_JOB_LEASE", "120"))  # seconds a claimed job stays leased without renewal
+
+
+class WorkQueue:
+    """Interface shared by the queue backends.
+
+    Jobs are dicts with at least ``job_id`` and ``batch_id``; results are
+    JSON-serializable dicts stored against their job.
+    """
+
+    def push(self, batch_id: str, payload: dict) -> str:
+        """Enqueue a job and return its ID."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, timeout: float = 5.0) -> dict | None:
+        """Take the next queued job, waiting up to ``timeout`` seconds."""
+        raise NotImplementedError
+
+    def renew(self, job: dict):
+        """Extend the lease of a claimed job by JOB_LEASE seconds."""
+        raise NotImplementedError
+
+    def requeue_expired(self) -> list[str]:
+        """Put claimed jobs whose lease expired back on the queue and return their IDs."""
+        raise NotImplementedError
+
+    def complete(self, job: dict, result: dict):
+        """Store the result of a claimed job."""
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> dict[str, dict]:
+        """Return the results received so far for a batch, keyed by job ID."""
+        raise NotImplementedError
+
+    def cancel(self, batch_id: str) -> list[str]:
+        """Drop the batch's jobs that no worker has claimed yet and return their IDs."""
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue stored in a SQLite database file."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    worker_id TEXT,
+                    enqueued_at REAL NOT NULL,
+                    claimed_at REAL,
+                    result TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, enqueued_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def push(self, batch_id: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, batch_id, payload, enqueued_at) VALUES (?, ?, ?, ?)",
+                (job_id, batch_id, json.dumps(payload), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker_id: str, timeout: float = 5.0) -> dict | None:
+        deadline = time.monotonic() + timeout
+        with closing(self._connect()) as conn:
+            while True:
+                # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+                conn.execute("BEGIN IMMEDIATE")
+                self._requeue_expired(conn)
+                row = conn.execute(
+                    "SELECT job_id, batch_id, payload FROM jobs WHERE status = 'queued' ORDER BY enqueued_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_id = ?, claimed_at = ? WHERE job_id = ?",
+                        (worker_id, time.time(), row[0]),
+                    )
+                conn.execute("COMMIT")
+                if row:
+                    return {**json.loads(row[2]), "job_id": row[0], "batch_id": row[1]}
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(0.5)
+
+    def _requeue_expired(self, conn: sqlite3.Connection) -> list[str]:
+        rows = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker_id = NULL, claimed_at = NULL "
+            "WHERE status = 'running' AND claimed_at < ? RETURNING job_id",
+            (time.time() - JOB_LEASE,),
+        ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def renew(self, job: dict):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET claimed_at = ? WHERE job_id = ? AND status = 'running'",
+                (time.time(), job["job_id"]),
+            )
+
+    def requeue_expired(self) -> list[str]:
+        with closing(self._connect()) as conn:
+            return self._requeue_expired(conn)
+
+    def complete(self, job: dict, result: dict):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ? WHERE job_id = ?",
+                (json.dumps(result), job["job_id"]),
+            )
+
+    def results(self, batch_id: str) -> dict[str, dict]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT job_id, result FROM jobs WHERE batch_id = ? AND status = 'done'", (batch_id,)
+            ).fetchall()
+        return {job_id: json.loads(result) for job_id, result in rows}
+
+    def cancel(self, batch_id: str) -> list[str]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "UPDATE jobs SET status = 'cancelled' WHERE batch_id = ? AND status = 'queued' RETURNING job_id",
+                (batch_id,),
+            ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+
+class RedisWorkQueue(WorkQueue):
+    """Work queue on Redis, for workers on several machines.
+
+    Jobs wait in one list shared by all batches and move atomically to a
+    processing list when claimed, with their lease deadlines in a hash;
+    each batch keeps its results in a hash. Requires the optional ``redis``
+    package (and Redis 6.2 or later for BLMOVE).
+    """
+
+    JOBS_KEY = "qa:jobs"
+    PROCESSING_KEY = "qa:jobs:processing"
+    LEASES_KEY = "qa:jobs:leases"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("Redis work queue requires the redis package: uv sync --extra distributed") from None
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def push(self, batch_id: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        self._redis.lpush(self.JOBS_KEY, json.dumps({**payload, "job_id": job_id, "batch_id": batch_id}))
+        return job_id
+
+    def claim(self, worker_id: str, timeout: float = 5.0) -> dict | None:
+        self.requeue_expired()
+        item = self._redis.blmove(self.JOBS_KEY, self.PROCESSING_KEY, max(1, int(timeout)), "RIGHT", "LEFT")
+        if item is None:
+            return None
+        self._redis.hset(self.LEASES_KEY, item, time.time() + JOB_LEASE)
+        return json.loads(item)
+
+    def renew(self, job: dict):
+        # Jobs are stored as json.dumps of the pushed dict, which json.loads round-trips
+        self._redis.hset(self.LEASES_KEY, json.dumps(job), time.time() + JOB_LEASE)
+
+    def requeue_expired(self) -> list[str]:
+        requeued = []
+        now = time.time()
+        for item in self._redis.lrange(self.PROCESSING_KEY, 0, -1):
+            lease = self._redis.hget(self.LEASES_KEY, item)
+            if lease is None:
+                # Claimed a moment ago, the claiming worker is about to set the lease
+                self._redis.hsetnx(self.LEASES_KEY, item, now + JOB_LEASE)
+            elif float(lease) < now and self._redis.lrem(self.PROCESSING_KEY, 1, item):
+                # Back at the consuming end of the queue, so it is claimed next
+                self._redis.rpush(self.JOBS_KEY, item)
+                self._redis.hdel(self.LEASES_KEY, item)
+                requeued.append(json.loads(item)["job_id"])
+        return requeued
+
+    def complete(self, job: dict, result: dict):
+        item = json.dumps(job)
+        self._redis.hset(f"qa:results:{job['batch_id']}", job["job_id"], json.dumps(result))
+        self._redis.lrem(self.PROCESSING_KEY, 1, item)
+        self._redis.hdel(self.LEASES_KEY, item)
+
+    def results(self, batch_id: str) -> dict[str, dict]:
+        return {job_id: json.loads(r) for job_id, r in self._redis.hgetall(f"qa:results:{batch_id}").items()}
+
+    def cancel(self, batch_id: str) -> list[str]:
+        cancelled = []
+        for item in self._redis.lrange(self.JOBS_KEY, 0, -1):
+            job = json.loads(item)
+            # LREM returns 0 if a worker popped the job in the meantime
+            if job["batch_id"] == batch_id and self._redis.lrem(self.JOBS_KEY, 1, item):
+                cancelled.append(job["job_id"])
+        return cancelled
+
+
+def get_work_queue(url: str | None = None) -> WorkQueue:
+    """Open the work queue at ``url`` (``sqlite:///path`` or ``redis://host``), default QA_QUEUE_URL."""
+    url = url or QUEUE_URL
+    if url.startswith("sqlite:///"):
+        return SQLiteWorkQueue(Path(url.removeprefix("sqlite:///")))
+    if url.startswith(("redis://", "rediss://")):
+        return RedisWorkQueue(url)
+    raise ValueError(f"Unsupported work queue URL: {url}")
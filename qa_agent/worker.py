@@ -0,0 +1,178 @@
+"""Distributed plan execution over a work queue.
+
+``dispatch_plans`` is the coordinator side: it enqueues one job per plan
+and merges the per-plan results workers push back. ``run_worker`` is the
+worker side, started with ``python -m qa_agent worker`` on any number of
+machines: each worker process runs plans with its own MCP session and
+runner agent.
+"""
+
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Iterator
+
+from qa_agent.agents import create_runner_agent
+from qa_agent.executor import emit_result, execute_with_retries
+from qa_agent.history import ResultsHistory, longest_first
+from qa_agent.results import PlanResult
+from qa_agent.usage import Usage, get_run_usage, usage_scope
+from qa_agent.work_queue import JOB_LEASE, WorkQueue, get_work_queue
+from qa_agent.workspace import get_path, run_scope
+
+COORDINATOR_TIMEOUT = float(os.environ.get("QA_COORDINATOR_TIMEOUT", "3600"))
+POLL_INTERVAL = 2.0
+
+
+def _materialize_plan(name: str, markdown: str):
+    """Write a job's plan into the local plans directory unless it is already there.
+
+    Lets workers on other machines run plans without a shared workspace.
+    """
+    path = get_path("plans") / f"{name}.md"
+    if not path.exists() or path.read_text() != markdown:
+        path.write_text(markdown)
+
+
+@contextmanager
+def _leased(queue: WorkQueue, job: dict) -> Iterator[None]:
+    """Renew the job's lease while the block runs, so it is not handed to another worker."""
+    done = threading.Event()
+
+    def renew():
+        while not done.wait(JOB_LEASE / 3):
+            try:
+                queue.renew(job)
+            except Exception as e:
+                print(f"Warning: Could not renew the lease of {job['plan']}: {e}")
+
+    renewer = threading.Thread(target=renew, daemon=True, name="qa-lease")
+    renewer.start()
+    try:
+        yield
+    finally:
+        done.set()
+        renewer.join()
+
+
+def run_worker(
+    queue_url: str | None = None,
+    max_jobs: int | None = None,
+    idle_timeout: float | None = None,
+) -> int:
+    """Process plan jobs from the work queue until stopped.
+
+    Args:
+        queue_url: Work queue to pull from (default: QA_QUEUE_URL)
+        max_jobs: Exit after this many jobs
+        idle_timeout: Exit after this many seconds without a job
+
+    Returns:
+        Number of jobs processed
+    """
+    queue = get_work_queue(queue_url)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    history = ResultsHistory()
+    agent = create_runner_agent()
+    processed = 0
+    idle_since = time.monotonic()
+    print(f"👷 Worker {worker_id} waiting for jobs")
+
+    while max_jobs is None or processed < max_jobs:
+        job = queue.claim(worker_id)
+        if job is None:
+            if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                print(f"Worker {worker_id} idle for {idle_timeout:.0f}s, exiting")
+                break
+            continue
+
+        with _leased(queue, job), run_scope(job["run_id"]), usage_scope(node="worker"):
+            try:
+                _materialize_plan(job["plan"], job["markdown"])
+                result = execute_with_retries(job["plan"], agent, None, history, job["run_id"])
+            except Exception as e:
+                result = PlanResult(plan=job["plan"], status="FAIL", category="ENVIRONMENT", details=str(e))
+        queue.complete(job, asdict(result))
+        processed += 1
+        idle_since = time.monotonic()
+
+    return processed
+
+
+def dispatch_plans(
+    plans: list[str],
+    run_id: str,
+    queue_url: str | None = None,
+    fail_fast: bool = False,
+    timeout: float = COORDINATOR_TIMEOUT,
+    cancel: threading.Event | None = None,
+) -> list[PlanResult]:
+    """Enqueue plans for workers and wait for their results.
+
+    Plans are enqueued longest-first so the long ones start early. Jobs
+    whose worker stopped renewing its lease are requeued. Plans without a
+    result before the timeout are reported as ENVIRONMENT failures. Results
+    are recorded in the coordinator's history, so ordering and flaky
+    detection see distributed runs too.
+
+    Args:
+        plans: Plan names to execute
+        run_id: Run the jobs belong to; workers write outputs to its workspace
+        queue_url: Work queue to use (default: QA_QUEUE_URL)
+        fail_fast: After the first failure, cancel the jobs no worker has
+            started; they are reported as SKIPPED
+        timeout: Seconds to wait for all results
+        cancel: Set by the caller to cancel the jobs no worker has started
+    """
+    if not plans:
+        return []
+    queue = get_work_queue(queue_url)
+    history = ResultsHistory()
+    ordered = longest_first(plans, history)
+    jobs = {
+        queue.push(run_id, {"plan": name, "run_id": run_id, "markdown": (get_path("plans") / f"{name}.md").read_text()}): name
+        for name in ordered
+    }
+    print(f"Dispatched {len(jobs)} tests to workers (batch {run_id})")
+
+    results: dict[str, PlanResult] = {}
+    deadline = time.monotonic() + timeout
+    while len(results) < len(jobs):
+        for job_id, data in queue.results(run_id).items():
+            if job_id in jobs and job_id not in results:
+                results[job_id] = PlanResult(**data)
+                print(f"   {data['plan']}: {data['status']}")
+                # Workers on a shared workspace have recorded it already
+                if not history.recorded(run_id, data["plan"]):
+                    history.record(run_id, results[job_id])
+                if data.get("usage"):
+                    # Workers run in other processes, so their usage is merged here
+                    get_run_usage().record(Usage(**data["usage"]), node="worker", plan=data["plan"])
+                emit_result(results[job_id])
+                if fail_fast and data["status"] == "FAIL":
+                    print(f"Fail-fast: {data['plan']} failed, cancelling queued tests")
+                    cancel = cancel or threading.Event()
+                    cancel.set()
+        for requeued_id in queue.requeue_expired():
+            if requeued_id in jobs:
+                print(f"Warning: Worker lease on {jobs[requeued_id]} expired, requeued it")
+        if cancel is not None and cancel.is_set():
+            for cancelled_id in queue.cancel(run_id):
+                results[cancelled_id] = PlanResult(plan=jobs[cancelled_id], status="SKIPPED")
+        if len(results) < len(jobs):
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+
+    if len(results) < len(jobs):
+        queue.cancel(run_id)
+        print(f"Warning: {len(jobs) - len(results)} tests got no worker result within {timeout:.0f}s")
+    return [
+        results.get(job_id) or PlanResult(
+            plan=name, status="FAIL", category="ENVIRONMENT", details=f"No worker result within {timeout:.0f}s"
+        )
+        for job_id, name in jobs.items()
+    ]
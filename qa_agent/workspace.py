@@ -1,5 +1,13 @@
 import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
 from pathlib import Path
+from typing import Iterator
+from urllib.parse import urljoin
 
 PROJECT_ROOT = Path(__file__).parent.parent.resolve()
 WORKSPACE_ROOT = Path(os.environ.get("QA_WORKSPACE", str(PROJECT_ROOT / "qa_workspace"))).resolve()
@@ -10,20 +18,145 @@ PATHS = {
     "reports": WORKSPACE_ROOT / "reports",
     "screenshots": WORKSPACE_ROOT / "screenshots",
     "wrike_reports": WORKSPACE_ROOT / "wrike_reports",
+    "tool_outputs": WORKSPACE_ROOT / "tool_outputs",
+    "baselines": WORKSPACE_ROOT / "baselines",
+    "visual_diffs": WORKSPACE_ROOT / "visual_diffs",
+    "traffic": WORKSPACE_ROOT / "traffic",
 }
 
+# Outputs that each run writes into its own runs/<run_id>/ directory, so
+# concurrent runs on one host never mix them. Plans stay shared.
+RUN_SCOPED = ("reports", "screenshots", "tool_outputs", "visual_diffs")
+RUNS_ROOT = WORKSPACE_ROOT / "runs"
+
+# Outputs that each cell of a matrix run writes into its own subdirectory
+# of the run's directory, since every cell runs the same plans.
+CELL_SCOPED = ("screenshots",)
+
+_current_run: ContextVar[str | None] = ContextVar("qa_run_id", default=None)
+_current_cell: ContextVar[tuple[str, str] | None] = ContextVar("qa_cell", default=None)  # (cell name, target URL)
+
 
 def init_workspace():
     WORKSPACE_ROOT.mkdir(parents=True, exist_ok=True)
     for path in PATHS.values():
         path.mkdir(parents=True, exist_ok=True)
+    RUNS_ROOT.mkdir(parents=True, exist_ok=True)
     return WORKSPACE_ROOT
 
 
-def get_path(name: str) -> Path:
+def get_path(name: str, shared: bool = False) -> Path:
+    """Resolve a workspace directory.
+    
+    Inside a ``run_scope``, run-scoped names (reports, screenshots,
+    tool_outputs, visual_diffs) resolve to the current run's directory unless ``shared``.
+    Inside a ``cell_scope`` as well, screenshots resolve to the cell's subdirectory.
+    """
+    run_id = _current_run.get()
+    if run_id and name in RUN_SCOPED and not shared:
+        path = RUNS_ROOT / run_id / name
+        cell = _current_cell.get()
+        if cell and name in CELL_SCOPED:
+            path = path / cell[0]
+        return path.resolve()
     path = PATHS.get(name, WORKSPACE_ROOT)
     return path.resolve()
 
 
+def get_run_id() -> str | None:
+    return _current_run.get()
+
+
+@contextmanager
+def run_scope(run_id: str) -> Iterator[Path]:
+    """Route run-scoped outputs of the enclosed code to ``runs/<run_id>/``.
+
+    Threads started with a copy of its context are routed there too.
+    """
+    run_dir = RUNS_ROOT / run_id
+    for name in RUN_SCOPED:
+        (run_dir / name).mkdir(parents=True, exist_ok=True)
+    token = _current_run.set(run_id)
+    try:
+        yield run_dir
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def cell_scope(name: str, target: str) -> Iterator[None]:
+    """Run the enclosed code as one cell of a matrix run.
+
+    ``get_test_app_url`` returns ``target`` instead of TEST_APP_URL, and
+    screenshots go to ``screenshots/<name>/`` of the run, so cells running
+    the same plans never overwrite each other's.
+    """
+    token = _current_cell.set((name, target))
+    try:
+        run_id = _current_run.get()
+        if run_id:
+            for scoped in CELL_SCOPED:
+                get_path(scoped).mkdir(parents=True, exist_ok=True)
+        yield
+    finally:
+        _current_cell.reset(token)
+
+
+def get_cell() -> str:
+    """Name of the current matrix cell, or "" outside a matrix run."""
+    cell = _current_cell.get()
+    return cell[0] if cell else ""
+
+
+def agent_path(path: Path) -> str:
+    """Return a workspace path as the agents' file tools address it (``/plans/x.md``)."""
+    return "/" + path.resolve().relative_to(WORKSPACE_ROOT).as_posix()
+
+
+def atomic_write_text(path: Path, text: str):
+    """Write a file so readers only ever see the old or the complete new content."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def publish_report(report_path: Path) -> Path:
+    """Atomically publish a run's report as the shared latest report."""
+    shared_path = get_path("reports", shared=True) / report_path.name
+    tmp_path = shared_path.with_name(f".{shared_path.name}.{uuid.uuid4().hex}.tmp")
+    shutil.copyfile(report_path, tmp_path)
+    os.replace(tmp_path, shared_path)
+    return shared_path
+
+
 def get_test_app_url() -> str:
-    return TEST_APP_URL
+    cell = _current_cell.get()
+    return cell[1] if cell else TEST_APP_URL
+
+
+def rebase_urls(text: str) -> str:
+    """Move URLs under TEST_APP_URL in ``text`` to the same place under the current target.
+
+    Plans are written against TEST_APP_URL, so their absolute URLs (in
+    navigation targets, URL assertions, ...) must follow the target of a
+    matrix cell, e.g. to run the same plans against a preview deployment.
+    """
+    target, planned = get_test_app_url(), TEST_APP_URL.rstrip("/")
+    if target == TEST_APP_URL or not text:
+        return text
+    return re.sub(re.escape(planned) + r"(?=[/?#\s\"'<>)\]]|$)", lambda _: target.rstrip("/"), text)
+
+
+def app_url(url: str) -> str:
+    """Resolve a URL from a test plan against the current target (see ``rebase_urls``).
+
+    Relative URLs are resolved against TEST_APP_URL, which the plan was
+    written against, and then rebased like absolute ones, so ``/patients``
+    keeps the target's sub-path (``https://preview.example.com/app/patients``).
+    """
+    return rebase_urls(urljoin(TEST_APP_URL, url))
+
+
+def new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
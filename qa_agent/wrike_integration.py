@@ -265,18 +265,22 @@ def post_qa_results_to_wrike(
     1. Format the report
     2. Save formatted report to wrike_reports/
     3. Post as comment
-    4. Optionally attach screenshots
+    4. Optionally attach the screenshot evidence, packed into one file
     5. Update task status
     
     Args:
         task_id: Wrike task ID
         report_path: Path to QA report
         screenshots_dir: Path to screenshots directory
-        attach_screenshots: Whether to attach screenshots (default: False)
+        attach_screenshots: Whether to attach screenshots (default: False).
+            Failure-state screenshots come first, then final states, chosen
+            from the ``results.json`` saved next to the report
         
     Returns:
         Dictionary with operation results
     """
+    from qa_agent.evidence import package_evidence, select_evidence
+    from qa_agent.results import load_results
     from qa_agent.workspace import get_path
     
     wrike = WrikeIntegration()
@@ -305,10 +309,11 @@ def post_qa_results_to_wrike(
     # Optionally attach screenshots
     attachments = []
     if attach_screenshots and screenshots_dir.exists():
-        screenshot_files = list(screenshots_dir.glob("*.png"))[:5]  # Limit to 5
-        for screenshot in screenshot_files:
-            att_result = wrike.add_task_attachment(task_id, screenshot)
-            attachments.append(att_result)
+        evidence = select_evidence(screenshots_dir, load_results(report_path.parent / "results.json"))
+        package = package_evidence(evidence, report_path.parent, f"evidence_{task_id}")
+        if package:
+            print(f"📦 Packed {len(evidence)} screenshots into {package.name}")
+            attachments.append(wrike.add_task_attachment(task_id, package))
     
     # Update status based on report content
     with open(report_path, 'r') as f:
@@ -6,6 +6,10 @@ It runs the planner, runner, and Wrike integration in sequence.
 
 Usage:
     python run_qa_workflow.py
+    python run_qa_workflow.py --stream                       # live progress
+    python run_qa_workflow.py --cancel-on-failure APP_BUG    # stop at the first app bug
+    python run_qa_workflow.py --json                         # events as JSON lines
+    python run_qa_workflow.py --target https://staging.example.com --profile chromium:1280x720 --profile "webkit:iPhone 15"
 
 Prerequisites:
     - Test application running on http://localhost:5173 (or set TEST_APP_URL)
@@ -13,11 +17,101 @@ Prerequisites:
     - Dependencies installed (uv sync)
 """
 
-from qa_agent.orchestrator import run_full
+import argparse
+import contextlib
+import json
+import sys
+
+from qa_agent.orchestrator import run_full, stream_workflow
+
+MESSAGE = "Test all patient management features including CRUD operations"
+WRIKE_TASK_ID = "EXPRESS-2024-001"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Zero-Touch QA workflow")
+    parser.add_argument("--stream", action="store_true", help="Print node transitions, tool calls and test results as they happen")
+    parser.add_argument("--json", action="store_true", help="Stream progress events as JSON lines (implies --stream)")
+    parser.add_argument(
+        "--cancel-on-failure",
+        nargs="*",
+        metavar="CATEGORY",
+        help="Stop starting tests after the first failure, optionally only of these categories "
+             "(APP_BUG, TEST_ISSUE, ENVIRONMENT); implies --stream",
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        metavar="URL",
+        help="Run the tests against this URL, optionally name=URL; repeat for a matrix run (default: QA_MATRIX_TARGETS)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        metavar="SPEC",
+        help="Run the tests in this browser profile, browser[:WIDTHxHEIGHT|device] (e.g. firefox:1280x720); "
+             "repeat for a matrix run (default: QA_MATRIX_PROFILES)",
+    )
+    return parser.parse_args()
+
+
+def print_event(event: dict):
+    """Print one progress event in human-readable form."""
+    kind = event["type"]
+    if kind == "node_start":
+        print(f"\n━━ {event['node'].upper()} ━━")
+    elif kind == "node_end" and event.get("error"):
+        print(f"❌ {event['node']} failed: {event['error']}")
+    elif kind == "tool_call":
+        print(f"   🔧 {event['tool']}" + (" (error)" if event.get("error") else ""))
+    elif kind == "test_result":
+        icon = {"PASS": "✅", "FAIL": "❌"}.get(event["status"], "⏭️ ")
+        detail = f" - {event['category']}: {event['details']}" if event["status"] == "FAIL" else ""
+        cell = f" [{event['cell']}]" if event.get("cell") else ""
+        print(f"{icon} {event['status']} {event['plan']}{cell} ({event['duration']}s){detail}")
+    elif kind == "cancelled":
+        print(f"\n🛑 Cancelling: {event['reason'].get('plan')} failed, remaining tests will be skipped")
+
+
+def stream(args) -> str:
+    """Run the workflow with live progress output and return its final message."""
+    categories = {c.upper() for c in args.cancel_on_failure or []}
+    
+    def critical(event: dict) -> bool:
+        return (
+            event["type"] == "test_result"
+            and event["status"] == "FAIL"
+            and (not categories or event["category"] in categories)
+        )
+    
+    events = stream_workflow(
+        "full",
+        message=MESSAGE,
+        post_to_wrike=True,
+        wrike_task_id=WRIKE_TASK_ID,
+        targets=args.target,
+        profiles=args.profile,
+        cancel_on=critical if args.cancel_on_failure is not None else None,
+    )
+    result = ""
+    for event in events:
+        if args.json:
+            print(json.dumps(event), file=sys.__stdout__, flush=True)
+        else:
+            print_event(event)
+        if event["type"] == "done":
+            result = event["message"]
+    return result
 
 
 def main():
     """Execute the complete Zero-Touch QA workflow."""
+    args = parse_args()
+    if args.json:
+        # Keep stdout for the JSON lines, workflow logging goes to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            stream(args)
+        return
     
     print("\n" + "="*70)
     print("🚀 ZERO-TOUCH QA WORKFLOW")
@@ -32,11 +126,16 @@ def main():
     
     # Run full workflow with Wrike integration enabled
     try:
-        result = run_full(
-            message="Test all patient management features including CRUD operations",
-            post_to_wrike=True,
-            wrike_task_id="EXPRESS-2024-001"
-        )
+        if args.stream or args.cancel_on_failure is not None:
+            stream(args)
+        else:
+            run_full(
+                message=MESSAGE,
+                post_to_wrike=True,
+                wrike_task_id=WRIKE_TASK_ID,
+                targets=args.target,
+                profiles=args.profile,
+            )
         
         print("\n" + "="*70)
         print("✅ WORKFLOW COMPLETE")
@@ -44,8 +143,8 @@ def main():
         
         print("\n📂 Generated Outputs:")
         print("  • Test Plans:      qa_workspace/plans/")
-        print("  • Test Report:     qa_workspace/reports/test_report.md")
-        print("  • Screenshots:     qa_workspace/screenshots/")
+        print("  • Test Report:     qa_workspace/reports/test_report.md (latest run)")
+        print("  • Run Outputs:     qa_workspace/runs/<run_id>/ (report, screenshots)")
         print("  • Wrike Report:    qa_workspace/wrike_reports/")
         
         print("\n📊 View Results:")
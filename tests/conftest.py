@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep test runs out of the project's qa_workspace (read when qa_agent is imported)
+os.environ.setdefault("QA_WORKSPACE", tempfile.mkdtemp(prefix="qa_workspace_"))
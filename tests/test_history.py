@@ -0,0 +1,32 @@
+from qa_agent.history import ResultsHistory, is_flaky
+from qa_agent.results import PlanResult
+
+
+def test_skipped_plans_are_not_recorded(tmp_path):
+    history = ResultsHistory(tmp_path / "history.db")
+    history.record("run1", PlanResult(plan="login", status="SKIPPED", details="Run token budget of 1,000 exceeded"))
+    history.record("run1", PlanResult(plan="signup", status="PASS"))
+
+    assert not history.recorded("run1", "login")
+    assert history.recorded("run1", "signup")
+
+
+def test_retries_within_a_run_are_not_flips(tmp_path):
+    history = ResultsHistory(tmp_path / "history.db")
+    started = 1000.0
+    for run_id, outcomes in [("run1", ["PASS"]), ("run2", ["FAIL", "PASS"]), ("run3", ["FAIL", "PASS"])]:
+        for attempt, outcome in enumerate(outcomes, start=1):
+            started += 1
+            history.record(run_id, PlanResult(plan="login", status=outcome, attempts=attempt), started)
+
+    assert history.outcomes("login") == ["PASS", "PASS", "PASS"]
+    assert not is_flaky(history.outcomes("login"))
+
+
+def test_outcomes_alternating_across_runs_are_flaky(tmp_path):
+    history = ResultsHistory(tmp_path / "history.db")
+    for number, outcome in enumerate(["PASS", "FAIL", "PASS"], start=1):
+        history.record(f"run{number}", PlanResult(plan="login", status=outcome), 1000.0 + number)
+
+    assert history.outcomes("login") == ["PASS", "FAIL", "PASS"]
+    assert is_flaky(history.outcomes("login"))
@@ -0,0 +1,49 @@
+import json
+
+from qa_agent.plan_index import PlanIndex
+
+PLAN = """# Test: {title}
+
+## Test Steps
+1. Navigate to https://app.example.com/signup
+2. Type "{value}" into the textbox "Age"
+3. Click the button "Create account"
+4. Wait for the page to update
+
+## Expected Results
+- The page shows "{message}"
+- The account list has {count} entries
+"""
+
+
+def test_boundary_and_negative_variants_are_not_near_duplicates(tmp_path):
+    (tmp_path / "signup_valid_age.md").write_text(
+        PLAN.format(title="Valid age", value="30", message="Welcome aboard", count=1)
+    )
+    index = PlanIndex(tmp_path)
+
+    for value, message, count in [("17", "You must be 18 or older", 0), ("-1", "Enter a valid age", 0)]:
+        decision = index.check(PLAN.format(title="Age variant", value=value, message=message, count=count))
+        assert decision.action == "write"
+        assert decision.match == ""
+
+
+def test_near_duplicate_never_replaces_an_existing_plan(tmp_path):
+    existing = PLAN.format(title="Valid age", value="30", message="Welcome aboard", count=1)
+    (tmp_path / "signup_valid_age.md").write_text(existing)
+    index = PlanIndex(tmp_path, threshold=0.7)
+
+    decision = index.check(existing + "- The confirmation email is sent\n")
+    assert (decision.action, decision.match) == ("write", "signup_valid_age")
+    assert index.check(existing).action == "skip"
+
+
+def test_index_built_with_older_normalization_is_rebuilt(tmp_path):
+    plan = tmp_path / "signup_valid_age.md"
+    plan.write_text(PLAN.format(title="Valid age", value="30", message="Hi", count=1))
+    stale = {"signup_valid_age": {"mtime": plan.stat().st_mtime, "size": 1, "signature": [0] * 64}}
+    (tmp_path / ".plan_index.json").write_text(json.dumps(stale))
+
+    index = PlanIndex(tmp_path)
+    index.refresh()
+    assert index.check(PLAN.format(title="Same", value="30", message="Hi", count=1)).action == "skip"
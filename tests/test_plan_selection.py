@@ -0,0 +1,31 @@
+from qa_agent.plan_index import PlanIndex
+from qa_agent.plans import select_plans
+from qa_agent.workspace import new_run_id, run_scope
+
+NAMES = ["login", "login_lockout", "checkout_flow", "blogin"]
+
+
+def test_select_plans_matches_whole_names():
+    assert select_plans("run the login test", NAMES) == ["login"]
+    assert select_plans("Run login_lockout and checkout flow", NAMES) == ["login_lockout", "checkout_flow"]
+    assert select_plans("run checkout-flow", NAMES) == ["checkout_flow"]
+
+
+def test_select_plans_defaults_to_all_plans():
+    assert select_plans("run everything", NAMES) == NAMES
+    assert select_plans("run checkout", NAMES) == NAMES
+
+
+def test_planned_plans_are_tracked_per_run(tmp_path):
+    index = PlanIndex(tmp_path)
+    first, second = new_run_id(), new_run_id()
+
+    with run_scope(first):
+        index.mark_planned("login")
+        index.mark_planned("checkout_flow")
+    with run_scope(second):
+        index.mark_planned("login_lockout")
+
+    assert index.planned(first) == ["checkout_flow", "login"]
+    assert index.planned(second) == ["login_lockout"]
+    assert index.planned(new_run_id()) == []
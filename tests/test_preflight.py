@@ -0,0 +1,25 @@
+from qa_agent.preflight import fatal_console_errors, has_content
+
+RENDERED = '- Page URL: http://app/\n- Page Snapshot:\n```yaml\n- generic [ref=e1]:\n  - heading "Home" [level=1] [ref=e2]\n```'
+BLANK = "- Page URL: http://app/\n- Page Snapshot:\n```yaml\n- generic [ref=e1]\n```"
+CONSOLE = (
+    "- [ERROR] Uncaught TypeError: Cannot read properties of undefined (reading 'x')\n"
+    "- [ERROR] ChunkLoadError: Loading chunk 42 failed.\n"
+    "- [WARNING] Uncaught ReferenceError in a warning\n"
+)
+
+
+def test_has_content():
+    assert has_content(RENDERED)
+    assert not has_content(BLANK)
+
+
+def test_uncaught_errors_on_rendered_page_are_not_fatal():
+    assert fatal_console_errors(CONSOLE, RENDERED) == ["ChunkLoadError: Loading chunk 42 failed."]
+
+
+def test_uncaught_errors_on_blank_page_are_fatal():
+    assert fatal_console_errors(CONSOLE, BLANK) == [
+        "Uncaught TypeError: Cannot read properties of undefined (reading 'x')",
+        "ChunkLoadError: Loading chunk 42 failed.",
+    ]
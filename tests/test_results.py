@@ -0,0 +1,19 @@
+from qa_agent.results import parse_agent_result
+
+
+def test_last_result_line_is_the_verdict():
+    reply = (
+        "I will report RESULT: PASS when done.\n"
+        "Clicked Save, the form kept its old values.\n"
+        "RESULT: FAIL - APP_BUG: save broken"
+    )
+    assert parse_agent_result(reply) == ("FAIL", "APP_BUG", "save broken")
+
+
+def test_result_line_details_stop_at_end_of_line():
+    assert parse_agent_result("RESULT: **PASS**\nAll steps done.") == ("PASS", "", "")
+    assert parse_agent_result("RESULT: FAIL: button missing\nmore notes") == ("FAIL", "APP_BUG", "button missing")
+
+
+def test_missing_result_line_is_a_test_issue():
+    assert parse_agent_result("Done.") == ("FAIL", "TEST_ISSUE", "Runner agent did not report a result")
@@ -0,0 +1,24 @@
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from qa_agent.playwright_mcp import _copy_screenshot_to_workspace, track_screenshots
+from qa_agent.workspace import new_run_id, run_scope
+
+
+def test_screenshots_are_tracked_per_block(tmp_path):
+    png = tmp_path / "shot.png"
+    png.write_bytes(b"png")
+
+    def run(name: str) -> list[str]:
+        with track_screenshots() as saved:
+            _copy_screenshot_to_workspace(str(png), f"{name}_step1")
+            # Tools run on executor threads that copy the caller's context
+            with ContextThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(_copy_screenshot_to_workspace, str(png), f"{name}_final").result()
+        return saved
+
+    with run_scope(new_run_id()):
+        with ContextThreadPoolExecutor(max_workers=2) as executor:
+            login, lockout = executor.map(run, ["login", "login_lockout"])
+
+    assert login == ["login_step1.png", "login_final.png"]
+    assert lockout == ["login_lockout_step1.png", "login_lockout_final.png"]
@@ -0,0 +1,33 @@
+import re
+
+from qa_agent.tool_output import apply_output_policy
+from qa_agent.workspace import WORKSPACE_ROOT, new_run_id, run_scope
+
+
+def test_oversized_output_is_spilled_to_run_workspace():
+    run_id = new_run_id()
+    snapshot = "\n".join(f'- button "Item {i}" [ref=e{i}]' for i in range(5000))
+
+    with run_scope(run_id):
+        shortened = apply_output_policy("browser_snapshot", snapshot)
+
+    match = re.search(r"saved to (\S+), use read_file", shortened)
+    assert match, shortened
+    agent_path = match.group(1)
+    assert agent_path.startswith(f"/runs/{run_id}/tool_outputs/browser_snapshot_")
+    assert (WORKSPACE_ROOT / agent_path.lstrip("/")).read_text() == snapshot
+    assert len(shortened) < len(snapshot)
+
+
+def test_summarized_console_output_is_spilled():
+    console = "\n".join(f"[ERROR] Failed to load resource {i}" for i in range(1000))
+
+    with run_scope(new_run_id()):
+        shortened = apply_output_policy("browser_console_messages", console)
+
+    assert shortened.startswith("Console summary: 1000 ERROR")
+    assert re.search(r"saved to /runs/[^/]+/tool_outputs/browser_console_messages_\S+\.txt", shortened)
+
+
+def test_small_output_is_unchanged():
+    assert apply_output_policy("browser_snapshot", "- Page URL: /") == "- Page URL: /"
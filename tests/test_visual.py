@@ -0,0 +1,40 @@
+import numpy as np
+from PIL import Image
+
+from qa_agent.visual import compare_screenshot
+
+
+def _save(path, pixels):
+    Image.fromarray(pixels.astype(np.uint8)).save(path)
+    return path
+
+
+def test_scattered_pixel_noise_with_high_ssim_is_unchanged(tmp_path):
+    reference = np.tile(np.linspace(0, 255, 200), (200, 1))
+    noisy = reference.copy()
+    noisy[::20, ::20] = np.clip(noisy[::20, ::20] + 20, 0, 255)  # anti-aliasing-like: 0.25% of pixels, slightly off
+
+    result = compare_screenshot(_save(tmp_path / "a.png", noisy), _save(tmp_path / "b.png", reference), tmp_path)
+
+    assert result.pixel_ratio > 0.001
+    assert result.ssim >= 0.98
+    assert result.status == "unchanged"
+
+
+def test_changed_region_is_changed(tmp_path):
+    reference = np.tile(np.linspace(0, 255, 200), (200, 1))
+    changed = reference.copy()
+    changed[50:150, 50:150] = 0
+
+    result = compare_screenshot(_save(tmp_path / "a.png", changed), _save(tmp_path / "b.png", reference), tmp_path)
+
+    assert result.status == "changed"
+    assert (tmp_path / "a.png").exists() and result.diff_image == "a.png"
+
+
+def test_images_smaller_than_the_ssim_window_are_compared(tmp_path):
+    result = compare_screenshot(
+        _save(tmp_path / "a.png", np.full((4, 4), 128)), _save(tmp_path / "b.png", np.zeros((4, 4))), tmp_path
+    )
+
+    assert result.status == "changed"
@@ -0,0 +1,19 @@
+from qa_agent import workspace
+from qa_agent.workspace import app_url, cell_scope, rebase_urls
+
+
+def test_relative_and_absolute_plan_urls_agree_on_target_sub_path(monkeypatch):
+    monkeypatch.setattr(workspace, "TEST_APP_URL", "http://localhost:3000")
+
+    with cell_scope("preview", "https://preview.example.com/app"):
+        assert app_url("/patients") == "https://preview.example.com/app/patients"
+        assert app_url("patients?page=2") == "https://preview.example.com/app/patients?page=2"
+        assert app_url("http://localhost:3000/patients") == "https://preview.example.com/app/patients"
+        assert rebase_urls("Open http://localhost:3000/patients") == "Open https://preview.example.com/app/patients"
+        assert app_url("https://other.example.com/x") == "https://other.example.com/x"
+
+
+def test_plan_urls_outside_a_matrix_resolve_against_test_app_url(monkeypatch):
+    monkeypatch.setattr(workspace, "TEST_APP_URL", "http://localhost:3000")
+
+    assert app_url("/patients") == "http://localhost:3000/patients"